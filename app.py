@@ -14,7 +14,14 @@ import io
 import altair as alt
 from datetime import datetime
 
-from config import BUCKET, TOPICS_PREFIX
+from config import (
+    BUCKET, TOPICS_PREFIX, CUBE_PREFIX, PRIORITY_TOP_KEY,
+    VIEW_CACHE_MAX_ENTRIES, VIEW_CACHE_MAX_MB,
+)
+from labels import clean_label
+from cube import topic_tables
+from viewcache import ViewCache
+from query import ReviewStore
 # En config.py deben existir:
 #    BUCKET = "bbva-playstore-reviews"
 #    TOPICS_PREFIX = "topicos/playstore"
@@ -41,51 +48,43 @@ st.title("🇪🇸 Dashboard: Sentimiento y Tópicos de Reseñas ")
 
 
 # ================================================
-# 2) Funciones de carga desde S3
+# 2) Capa de consultas sobre S3
 # ================================================
-@st.cache_data
-def list_csv_keys(bucket: str, prefix: str) -> list[str]:
-    paginator = s3.get_paginator("list_objects_v2")
-    keys = []
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-        for obj in page.get("Contents", []):
-            key = obj.get("Key", "")
-            if key.lower().endswith(".csv"):
-                keys.append(key)
-    return keys
-
-@st.cache_data
-def load_all_review_topics(bucket: str, prefix: str) -> pd.DataFrame:
+@st.cache_resource(ttl=3600)
+def get_store(bucket: str, prefix: str, dataset: str = "topics") -> ReviewStore:
     """
-    Lee todos los CSV de reseñas + tópicos desde S3 (cada fila es una reseña
-    asignada a un tópico; columnas esperadas al menos: review_date, content, score,
-    sentiment_pred, topic_id, topic_label, appVersion).
-    Devuelve un único DataFrame con todas las reseñas de todos los meses.
+    Reseñas + tópicos de todos los meses (TOPICS_PREFIX/YYYY_MM/topics_YYYY_MM.parquet)
+    como dataset de DuckDB, o el cubo de conteos (CUBE_PREFIX) con dataset="cube".
+    Nada se descarga por adelantado: cada sección pide solo los meses de su rango
+    y las columnas que usa. El listado de meses se renueva cada hora.
     """
- 
-    keys = list_csv_keys(bucket, prefix)
-    dfs = []
-    for key in keys:
-        content = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
-        df = pd.read_csv(io.BytesIO(content), on_bad_lines="skip")
-        # Validar que existan las columnas mínimas
-        required = ["review_date", "content", "score", "sentiment_pred", "topic_id", "topic_label", "appVersion"]
-        if not all(col in df.columns for col in required):
-            continue
-        # Convertir review_date a datetime.date
-        df["review_date"] = pd.to_datetime(df["review_date"], format="%Y-%m-%d", errors="coerce").dt.date
-        dfs.append(df)
-    if dfs:
-        return pd.concat(dfs, ignore_index=True)
-    return pd.DataFrame()
+    return ReviewStore(dataset, root=f"s3://{bucket}/{prefix}", credentials={
+        "key_id": aws_access_key_id, "secret": aws_secret_access_key, "region": aws_region,
+    }, s3_client=s3)   # st.secrets["aws"] no se exporta al entorno: la cadena por defecto no tiene llaves
+
+@st.cache_resource
+def get_view_cache() -> ViewCache:
+    # compartido entre sesiones; las llaves incluyen data_token
+    return ViewCache(max_entries=VIEW_CACHE_MAX_ENTRIES, max_bytes=VIEW_CACHE_MAX_MB * 1024**2)
 
 # ================================================
-# 3) Cargar datos completos de reseñas + tópicos
+# 3) Meses disponibles, rango de fechas y versiones
 # ================================================
-df_reviews = load_all_review_topics(BUCKET, TOPICS_PREFIX)
-if df_reviews.empty:
-    st.error("No se encontraron archivos de reseñas+topics en S3 bajo el prefijo indicado.")
+store      = get_store(BUCKET, TOPICS_PREFIX)
+cube_store = get_store(BUCKET, CUBE_PREFIX, "cube")
+if not store.months():
+    st.error("No se encontraron archivos de reseñas+topics en S3 bajo el prefijo indicado "
+             "(los CSV anteriores se convierten con `python query.py convert`).")
+    st.stop()
+
+view_cache = get_view_cache()
+data_token = store.token   # huella (ETags) de los Parquet listados: cambia solo si se reescribe un mes
+
+min_date, max_date = view_cache.get((data_token,), "fechas", store.date_bounds)
+if min_date is None:
+    st.error("Las reseñas cargadas no tienen fechas válidas.")
     st.stop()
+versions = view_cache.get((data_token,), "versiones", store.versions)
 
 # Bloque 4) Filtro: fecha o una o más versiones
 st.subheader("🔍 Filtrar datos")
@@ -95,12 +94,6 @@ filter_mode = st.radio(
     index=0
 )
 
-# Obtener rango total de fechas y versiones disponibles
-min_date = df_reviews["review_date"].min()
-max_date = df_reviews["review_date"].max()
-versions = df_reviews["appVersion"].dropna().astype(str).unique().tolist()
-versions.sort()
-
 if filter_mode == "Rango de fechas":
     start_date, end_date = st.date_input(
         "Selecciona rango de fechas:",
@@ -111,9 +104,10 @@ if filter_mode == "Rango de fechas":
     if start_date > end_date:
         st.error("La fecha inicial no puede ser mayor que la fecha final.")
         st.stop()
-    mask = (df_reviews["review_date"] >= start_date) & (df_reviews["review_date"] <= end_date)
-    df_range = df_reviews[mask].copy()
-    if df_range.empty:
+    filtro  = ("fechas", start_date, end_date)
+    filtros = {"start": start_date, "end": end_date}
+    total_rango = view_cache.get((data_token, filtro), "total", lambda: store.count_reviews(**filtros))
+    if total_rango == 0:
         st.warning("No hay reseñas dentro del rango seleccionado.")
         st.stop()
 else:
@@ -125,14 +119,16 @@ else:
     if not selected_versions:
         st.info("Selecciona al menos una versión para filtrar.")
         st.stop()
-    # Filtrar df_reviews por todas las versiones seleccionadas
-    df_range = df_reviews[df_reviews["appVersion"].astype(str).isin(selected_versions)].copy()
-    if df_range.empty:
+    # Filtrar por todas las versiones seleccionadas
+    filtro  = ("versiones", tuple(sorted(selected_versions)))
+    filtros = {"versions": filtro[1]}
+    start_date, end_date = view_cache.get((data_token, filtro), "fechas", lambda: store.date_bounds(**filtros))
+    if start_date is None:
         st.warning(f"No se encontraron reseñas para las versiones seleccionadas.")
         st.stop()
+    # el rango resultante también poda los meses que leen las consultas de abajo
+    filtros.update(start=start_date, end=end_date)
     # Mostrar rango de fechas resultante
-    start_date = df_range["review_date"].min()
-    end_date   = df_range["review_date"].max()
     st.markdown(
         f"**Rango de fechas para versiones seleccionadas:** "
         f"{start_date} – {end_date}"
@@ -156,15 +152,17 @@ min_stars = st.select_slider(
     format_func=format_stars
 )
 
-if min_stars > 0:
-    df_range = df_range[df_range["score"].astype(int) >= min_stars]
-
 # 5.2) Campo de búsqueda por palabra clave en el texto original de la reseña
 keyword = st.text_input("🔍 Buscar palabra clave en la reseña:")
-if keyword:
-    df_range = df_range[df_range["content"].str.contains(keyword, case=False, na=False)]
 
-if df_range.empty:
+# 5.3) Los filtros van completos al WHERE de cada consulta; los resultados se
+#      memorizan por la tupla de filtros normalizada (solo cambiar el sentimiento
+#      de la sección 4 ya no recalcula nada de arriba)
+filtros.update(min_stars=int(min_stars), keyword=keyword or "")
+view_key = (data_token, filtro, int(min_stars), keyword or "")
+resumen  = view_cache.get(view_key, "resumen", lambda: store.summary(**filtros))
+
+if resumen["total"] == 0:
     st.warning("No hay reseñas que cumplan todos los filtros seleccionados.")
     st.stop()
 
@@ -177,10 +175,8 @@ if df_range.empty:
 # ================================================
 import altair as alt
 
-# Recalcular conteos (usando df_range filtrado)
-total_reseñas = df_range.shape[0]
-pos_count = df_range[df_range["sentiment_pred"].str.upper() == "POS"].shape[0]
-neg_count = df_range[df_range["sentiment_pred"].str.upper() == "NEG"].shape[0]
+# Conteos del resumen (una sola agregación sobre las reseñas filtradas)
+total_reseñas, pos_count, neg_count = resumen["total"], resumen["pos"], resumen["neg"]
 
 # Calcular fracción y porcentaje redondeado
 pos_frac = pos_count / total_reseñas if total_reseñas else 0
@@ -261,7 +257,7 @@ st.markdown(
 )
 
 # — Cálculo del promedio general de calificación (sobre todo el rango filtrado)
-promedio_general = df_range["score"].mean().round(2)
+promedio_general = round(resumen["avg_score"] or 0.0, 2)
 
 # — Banner de “Calificación promedio” en amarillo
 st.markdown(
@@ -287,55 +283,27 @@ st.markdown(
 
 st.markdown("")  # Espacio antes del gráfico
 
-# — Agrupar por día y sentimiento para conteos POS/NEG
-df_daily_sent = (
-    df_range
-    .groupby(["review_date", "sentiment_pred"])
-    .size()
-    .reset_index(name="conteo")
-)
-
-# — Agrupar por día para promedio de calificación
-df_daily_score = (
-    df_range
-    .groupby("review_date")["score"]
-    .mean()
-    .reset_index(name="avg_score")
+def daily_lines(df_daily: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    # — Todas las fechas del rango: 0 reseñas y sin promedio los días sin datos
+    all_days = pd.DataFrame({"Fecha": pd.date_range(start=start_date, end=end_date).date})
+    por_dia  = all_days.merge(
+        df_daily.rename(columns={"review_date": "Fecha"}), on="Fecha", how="left"
+    )
+    promedio = por_dia["avg_score"].astype(float)
+
+    # — Dos filas por día: una para POS y otra para NEG, ambas con mismo promedio
+    pos = pd.DataFrame({"Fecha": por_dia["Fecha"], "Tipo": "Positivas",
+                        "Cantidad": por_dia["pos"].fillna(0).astype(int), "Promedio": promedio})
+    neg = pd.DataFrame({"Fecha": por_dia["Fecha"], "Tipo": "Negativas",
+                        "Cantidad": por_dia["neg"].fillna(0).astype(int), "Promedio": promedio})
+    return pd.concat([pos, neg]).sort_index(kind="stable").reset_index(drop=True)
+
+# — Serie diaria POS/NEG + promedio: conteos por día agregados en DuckDB
+#   (memorizada por combinación de filtros)
+df_line_all = view_cache.get(
+    view_key, "daily", lambda: daily_lines(store.sentiment_by_day(**filtros), start_date, end_date)
 )
 
-# — Crear DataFrame con todas las fechas del rango
-all_days = pd.DataFrame({"review_date": pd.date_range(start=start_date, end=end_date)})
-all_days["review_date"] = all_days["review_date"].dt.date
-
-# — Construir filas para POS, NEG y promedio
-rows = []
-for d in all_days["review_date"]:
-    # Conteo POS
-    pos_row = df_daily_sent[
-        (df_daily_sent["review_date"] == d) & 
-        (df_daily_sent["sentiment_pred"].str.upper() == "POS")
-    ]["conteo"]
-    pos_count = int(pos_row.iloc[0]) if not pos_row.empty else 0
-
-    # Conteo NEG
-    neg_row = df_daily_sent[
-        (df_daily_sent["review_date"] == d) & 
-        (df_daily_sent["sentiment_pred"].str.upper() == "NEG")
-    ]["conteo"]
-    neg_count = int(neg_row.iloc[0]) if not neg_row.empty else 0
-
-    # Promedio de calificación (None si no hay reseñas ese día)
-    score_row = df_daily_score[
-        df_daily_score["review_date"] == d
-    ]["avg_score"]
-    avg_score = float(score_row.iloc[0]) if not score_row.empty else None
-
-    # Agregar dos filas: una para POS y otra para NEG, ambas con mismo avg_score
-    rows.append({"Fecha": d, "Tipo": "Positivas", "Cantidad": pos_count, "Promedio": avg_score})
-    rows.append({"Fecha": d, "Tipo": "Negativas", "Cantidad": neg_count, "Promedio": avg_score})
-
-df_line_all = pd.DataFrame(rows)
-
 # — Gráfico de líneas para POS y NEG
 sent_chart = (
     alt.Chart(df_line_all[df_line_all["Tipo"].isin(["Positivas", "Negativas"])])
@@ -387,60 +355,20 @@ st.markdown("---")
 # ================================================
 st.markdown("### 3) Temas mas hablados")
 
-# 1) agregamos conteo por topic y sentimiento
-df_topics_agg2 = (
-    df_range
-    .groupby(["topic_id","topic_label","sentiment_pred"])
-    .size()
-    .reset_index(name="conteo")
-)
-df_topics_agg2 = df_topics_agg2[
-    ~df_topics_agg2["topic_label"].isin(["outlier","Comentario Corto"])
-]
-
-# 2) agregamos la versión más frecuente por tópico/sentimiento
-df_version_agg = (
-    df_range
-    .groupby(["topic_id","sentiment_pred","appVersion"])
-    .size()
-    .reset_index(name="version_count")
-)
-df_top_version = (
-    df_version_agg
-    .sort_values(["topic_id","sentiment_pred","version_count"], ascending=[True,True,False])
-    .drop_duplicates(subset=["topic_id","sentiment_pred"])
-    .loc[:,["topic_id","sentiment_pred","appVersion"]]
-    .rename(columns={"appVersion":"version"})
-)
-
-# 3) construir tablas para POS y NEG (sin límite de 5)
-df_pos_topics = (
-    df_topics_agg2[df_topics_agg2["sentiment_pred"].str.upper()=="POS"]
-    .merge(df_top_version[df_top_version["sentiment_pred"].str.upper()=="POS"],
-           on=["topic_id","sentiment_pred"], how="left")
-    .sort_values("conteo", ascending=False)
-    .copy()
-)
-df_neg_topics = (
-    df_topics_agg2[df_topics_agg2["sentiment_pred"].str.upper()=="NEG"]
-    .merge(df_top_version[df_top_version["sentiment_pred"].str.upper()=="NEG"],
-           on=["topic_id","sentiment_pred"], how="left")
-    .sort_values("conteo", ascending=False)
-    .copy()
+# 1) conteo por (tópico, sentimiento, versión) con los mismos filtros de arriba,
+#    sumado sobre el cubo de conteos (mucho menos filas que reseñas). La palabra
+#    clave necesita el texto de cada reseña y los meses previos al cubo no lo
+#    tienen (`python query.py convert` lo genera): en esos casos se agregan las filas
+# 2) conteo por tópico, versión más frecuente y etiquetas limpias
+def topic_tables_for_view() -> tuple[pd.DataFrame, pd.DataFrame]:
+    usa_cubo = not keyword and set(store.months()) <= set(cube_store.months())
+    return topic_tables((cube_store if usa_cubo else store).topics_by_version(**filtros))
+
+df_pos_topics, df_neg_topics = view_cache.get(
+    (*view_key, cube_store.token), "topics", topic_tables_for_view
 )
 
-# 4) limpiar etiquetas y renombrar columnas de salida
-def clean_label(label: str) -> str:
-    import re
-    text = re.sub(r'^\d+_', '', label)
-    return text.replace('_',' ').title()
-
-for df_topics in (df_pos_topics, df_neg_topics):
-    df_topics["Tópico"] = df_topics["topic_label"].apply(clean_label)
-    df_topics["# de reseñas"] = df_topics["conteo"]
-    df_topics["version"] = df_topics["version"].fillna("n/a")
-
-# 5) mostrar en dos columnas
+# 3) mostrar en dos columnas
 col3, col4 = st.columns(2)
 with col3:
     st.markdown("**Temas Positivos**")
@@ -483,11 +411,21 @@ sentiment_choice = st.radio(
     index=0
 )
 
-mask_sent = df_range["sentiment_pred"].str.upper() == (
-    "POS" if sentiment_choice == "Positivas" else "NEG"
-)
-topics_filtrados = df_range[mask_sent]["topic_label"].unique().tolist()
-topics_filtrados = [t for t in topics_filtrados if t not in ["outlier", "Comentario Corto"]]
+sent_sel = "POS" if sentiment_choice == "Positivas" else "NEG"
+
+# orden del explorador -> query.ORDERS (todos desempatan por recencia)
+ORDEN_EXPLORADOR = {
+    "Más recientes":                "recent",
+    "Calificación (menor a mayor)": "score_asc",
+    "Calificación (mayor a menor)": "score_desc",
+    "Versión":                      "version",
+}
+
+def topic_options(sent: str) -> list[str]:
+    labels = store.topic_labels(sentiment=sent, **filtros)
+    return [t for t in labels if t not in ["outlier", "Comentario Corto"]]
+
+topics_filtrados = view_cache.get(view_key, f"opciones_{sent_sel}", lambda: topic_options(sent_sel))
 label_map = {clean_label(t): t for t in topics_filtrados}
 lista_limpia = sorted(label_map.keys())
 
@@ -499,30 +437,39 @@ selected_topics_clean = st.multiselect(
 
 if selected_topics_clean:
     selected_topics = [label_map[clean] for clean in selected_topics_clean]
-    df_topic_sel = df_range[
-        mask_sent & df_range["topic_label"].isin(selected_topics)
-    ].copy()
-    df_topic_sel["sentimiento_orden"] = df_topic_sel["sentiment_pred"].str.upper().map({"POS": 0, "NEG": 1})
-    df_topic_sel = df_topic_sel.sort_values(
-        by=["sentimiento_orden", "review_date", "review_time"],
-        ascending=[True, False, False]
-    ).reset_index(drop=True)
-    df_topic_sel.drop(columns="sentimiento_orden", inplace=True)
-
-    if not df_topic_sel.empty:
+
+    # reseñas de los tópicos elegidos que pasan los filtros: se cuentan en DuckDB
+    # y de cada página solo se leen sus filas (ORDER BY + LIMIT/OFFSET)
+    filtros_sel = {**filtros, "sentiment": sent_sel, "topics": tuple(sorted(selected_topics))}
+    n_sel = view_cache.get(
+        view_key, f"n_{sent_sel}_{'|'.join(filtros_sel['topics'])}",
+        lambda: store.count_reviews(**filtros_sel)
+    )
+
+    if n_sel:
         st.markdown(
             f"**Reseñas {sentiment_choice.lower()} de tópicos seleccionados "
-            f"({', '.join(selected_topics_clean)})**:"
+            f"({', '.join(selected_topics_clean)})**: {n_sel:,}"
         )
+        c_orden, c_tam, c_pag = st.columns([2, 1, 1])
+        with c_orden:
+            orden = st.selectbox(
+                "Ordenar por:",
+                options=list(ORDEN_EXPLORADOR),
+                index=0
+            )
+        with c_tam:
+            page_size = st.selectbox("Reseñas por página:", options=[25, 50, 100], index=1)
+        n_pages = max(1, -(-n_sel // page_size))
+        with c_pag:
+            page = st.number_input(f"Página (de {n_pages}):", min_value=1, max_value=n_pages, value=1, step=1)
+
         # añadimos la columna appVersion y la mostramos como "version"
-        df_muestra = df_topic_sel[[
-            "review_date",
-            "review_time",
-            "topic_label",
-            "content",
-            "score",
-            "appVersion"
-        ]].copy()
+        df_muestra = store.reviews(
+            order=ORDEN_EXPLORADOR[orden], limit=page_size, offset=(page - 1) * page_size,
+            columns=["review_date", "review_time", "topic_label", "content", "score", "appVersion"],
+            **filtros_sel,
+        )
         df_muestra.columns = [
             "Fecha",
             "Hora",
@@ -531,11 +478,45 @@ if selected_topics_clean:
             "Calificación",
             "version"
         ]
-        df_muestra["Tópico"] = df_muestra["Tópico"].apply(clean_label)
-        st.dataframe(df_muestra, use_container_width=True, height=300)
+        df_muestra["Tópico"] = df_muestra["Tópico"].map(clean_label)
+        st.dataframe(df_muestra.reset_index(drop=True), use_container_width=True, height=300)
     else:
         st.write("No hay reseñas para esos tópicos y calificación en el conjunto filtrado.")
 else:
     st.info("Selecciona uno o más tópicos disponibles según el sentimiento elegido.")
 
+st.markdown("---")
+
+# ================================================
+# 12) Prioridad del backlog (tabla top-k precalculada por priority.py)
+# ================================================
+st.markdown("### 5) Prioridad del backlog")
+st.markdown(
+    """
+    Tópicos negativos ordenados por frecuencia reciente, negatividad,
+    calificación y concentración en una versión (todo el histórico).
+    """
+)
+
+@st.cache_data(ttl=3600)
+def load_top_issues(bucket: str, key: str) -> pd.DataFrame:
+    try:
+        content = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return pd.DataFrame()
+    return pd.read_csv(io.BytesIO(content))
+
+df_top_issues = load_top_issues(BUCKET, PRIORITY_TOP_KEY)
+if not df_top_issues.empty:
+    df_display = df_top_issues[[
+        "rank", "topic_name", "frequency", "avg_stars", "top_version", "last_seen", "priority"
+    ]].rename(columns={
+        "rank": "#", "topic_name": "Tópico", "frequency": "# de reseñas",
+        "avg_stars": "Calificación prom.", "top_version": "version",
+        "last_seen": "Última reseña", "priority": "Prioridad",
+    })
+    st.dataframe(df_display, use_container_width=True, hide_index=True, height=300)
+else:
+    st.write("Aún no hay tabla de prioridad generada por el pipeline.")
+
 # FIN DE app.py
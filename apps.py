@@ -0,0 +1,90 @@
+# apps.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import config
+
+# ---------------------------------------------------------
+# Configuración por app: llaves y prefijos que cambian entre apps. El resto de
+# config.py (modelos, backends, tamaños de lote) es común y se comparte.
+# ---------------------------------------------------------
+APP_SETTINGS = (
+    "APP_ID", "BUCKET", "RAW_PREFIX", "CLEAN_PREFIX", "SENTIMENT_PREFIX",
+    "TOPICS_PREFIX", "CUBE_PREFIX", "PRIORITY_PREFIX", "PRIORITY_STATE_KEY",
+    "PRIORITY_TOP_KEY", "ROLLING_MODEL_PREFIX", "STATE_KEY", "PROFILE_PREFIX",
+)
+_KEYS = ("BUCKET", "APP_ID")   # no son rutas: no llevan root
+
+
+def make_app(name: str, app_id: str, bucket: str = config.BUCKET, root: str = "") -> dict:
+    """
+    Configuración de una app a partir de config.py; con `root` todas sus rutas
+    quedan bajo "{root}/" para que varias apps puedan compartir bucket.
+    """
+    app = {"name": name}
+    for setting in APP_SETTINGS:
+        value = getattr(config, setting)
+        app[setting] = f"{root}/{value}" if root and setting not in _KEYS else value
+    app["APP_ID"] = app_id
+    app["BUCKET"] = bucket
+    return app
+
+
+DEFAULT_APP = make_app("default", config.APP_ID)
+
+
+def configured_apps() -> list[dict]:
+    """
+    Apps de config.APPS (o solo la app por defecto si la lista está vacía).
+    """
+    if not config.APPS:
+        return [DEFAULT_APP]
+    return [
+        make_app(a["name"], a["app_id"], a.get("bucket", config.BUCKET), a.get("root", ""))
+        for a in config.APPS
+    ]
+
+
+def find_app(name: str | None) -> dict:
+    if name is None or name == DEFAULT_APP["name"]:
+        return DEFAULT_APP
+    for app in configured_apps():
+        if app["name"] == name:
+            return app
+    raise ValueError(f"App desconocida: '{name}'")
+
+
+# ---------------------------------------------------------
+# App activa: una ContextVar, así cada hilo de orchestrator.run_apps
+# ve sus propios prefijos sin pasar la configuración por cada función.
+# ---------------------------------------------------------
+_current = ContextVar("app", default=DEFAULT_APP)
+
+
+def current_app() -> dict:
+    return _current.get()
+
+
+@contextmanager
+def use_app(app: dict):
+    token = _current.set(app)
+    try:
+        yield app
+    finally:
+        _current.reset(token)
+
+
+class _AppProxy:
+    """
+    `app.RAW_PREFIX`, `app.BUCKET`, ... de la app activa (se resuelve en cada acceso).
+    """
+
+    def __getattr__(self, name: str):
+        try:
+            return _current.get()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+app = _AppProxy()
@@ -0,0 +1,84 @@
+# bench_textprep.py
+# ----------------------------------------
+# Throughput del motor de preprocesamiento (textprep.py) contra la cadena
+# original de clean.py / topics.py. El corpus sintético está muy duplicado
+# y exagera el speedup: la equivalencia y el speedup sobre un mes real los
+# reporta check_textprep.py.
+#
+#   python bench_textprep.py                  # corpus sintético
+#   python bench_textprep.py reviews.csv      # columna `content` de un CSV raw
+# ----------------------------------------
+
+import sys
+import time
+import random
+
+import pandas as pd
+
+from textprep import clean_series, prepare_topic_series
+from check_textprep import reference_clean, reference_topics
+
+
+# ---------------------------------------------------------
+# 1) CORPUS
+# ---------------------------------------------------------
+FRASES = [
+    "Excelente", "execelente app!!", "Muy buena app", "muy buena APP 👍",
+    "No puedo hacer la trasferencia, se cierra sola", "La ultma_actualizacion no abrlr",
+    "Pésimo servicio, el cervicio al cliente nunca contesta...", "bue servicio",
+    "Me bloquea la cuenta cada vez que inicio sesión en el móvil",
+    "El token digital no llega; ¿alguien sabe por qué?", "Genial, gracias BBVA",
+    "no sirve para nada, mala aplicación", "Fácil de usar y rápida", None,
+    "Cobran comisiones que no aparecen en movimientos #molesto",
+    "app_nueva_version 11.2 falla al pagar tarjeta de crédito", "ñandú ça va über",
+]
+
+
+def synthetic_corpus(n: int, seed: int = 7) -> pd.Series:
+    rnd = random.Random(seed)
+    filas = []
+    for _ in range(n):
+        if rnd.random() < 0.6:
+            filas.append(rnd.choice(FRASES))  # alta duplicación, como en producción
+        else:
+            filas.append(" ".join(str(rnd.choice(FRASES) or "") for _ in range(rnd.randint(2, 4))))
+    return pd.Series(filas, dtype=object)
+
+
+# ---------------------------------------------------------
+# 2) TIEMPOS
+# ---------------------------------------------------------
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    if len(sys.argv) > 1:
+        raw = pd.read_csv(sys.argv[1])["content"]
+    else:
+        raw = synthetic_corpus(100_000)
+    dup = 1 - raw.nunique(dropna=False) / len(raw)
+    print(f"Corpus: {len(raw):,} reseñas ({raw.nunique():,} distintas, {dup:.0%} duplicadas)")
+
+    # clean.py
+    ref_clean, t_ref_clean = timed(lambda s: s.apply(reference_clean), raw)
+    _,         t_new_clean = timed(clean_series, raw)
+
+    # topics.py (sobre la salida de clean)
+    _, t_ref_top = timed(reference_topics, ref_clean)
+    _, t_new_top = timed(prepare_topic_series, ref_clean)
+
+    for nombre, t_ref, t_new in (
+        ("clean  ", t_ref_clean, t_new_clean),
+        ("topics ", t_ref_top, t_new_top),
+    ):
+        print(
+            f"{nombre} original {t_ref:7.3f}s ({len(raw)/t_ref:10,.0f} filas/s) | "
+            f"motor {t_new:7.3f}s ({len(raw)/t_new:10,.0f} filas/s) | x{t_ref/t_new:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
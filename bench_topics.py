@@ -0,0 +1,150 @@
+# bench_topics.py
+# ----------------------------------------
+# Velocidad vs calidad de los backends de tópicos (topic_backends.py)
+# sobre el mismo mes: tiempo, memoria pico y coherencia NPMI de las
+# palabras principales de cada tópico.
+#
+#   python bench_topics.py 2025_05                    # mes de SENTIMENT_PREFIX en S3
+#   python bench_topics.py reviews_sentiment.csv      # CSV local con content_clean y sentiment_pred
+#   python bench_topics.py 2025_05 tfidf onnx         # solo algunos backends
+# ----------------------------------------
+
+import sys
+import math
+import time
+import resource
+import multiprocessing as mp
+from itertools import combinations
+from queue import Empty
+
+import pandas as pd
+
+from textprep import prepare_topic_series
+import topic_backends
+
+NR_TOPICS  = 30     # misma partición y tamaño que apply_topics usa para NEG
+TOP_WORDS  = 10
+TIMEOUT_S  = 3_600  # por backend; un proceso que muere o se cuelga queda como fila fallida
+
+
+# ---------------------------------------------------------
+# 1) DATOS: reseñas NEG con >=3 palabras, igual que topics_for_month
+# ---------------------------------------------------------
+def load_docs(origen: str) -> list[str]:
+    if origen.endswith(".csv"):
+        df = pd.read_csv(origen)
+    else:
+        from topics import load_sentiment_csv_for_month
+        df = load_sentiment_csv_for_month(origen)
+    # misma entrada que topics_for_month: content_clean (salida de clean.py)
+    prep = prepare_topic_series(df["content_clean"])
+    df["content_clean"] = prep["content_clean"]
+    df["content_topic"] = prep["content_topic"]
+    df["token_count"]   = prep["token_count"]
+    df_long = df[df["token_count"] >= 3]
+    return df_long[df_long["sentiment_pred"] == "neg"]["content_topic"].tolist()
+
+
+# ---------------------------------------------------------
+# 2) COHERENCIA NPMI (co-ocurrencia por documento en el mismo corpus)
+# ---------------------------------------------------------
+def npmi_coherence(docs: list[str], info: pd.DataFrame, top_words: int = TOP_WORDS) -> float:
+    doc_sets = [set(d.split()) for d in docs]
+    n_docs   = len(doc_sets)
+    cache    = {}
+
+    def df_count(*words):
+        if words not in cache:
+            cache[words] = sum(1 for s in doc_sets if all(w in s for w in words))
+        return cache[words]
+
+    scores = []
+    for _, row in info[info["Topic"] != -1].iterrows():
+        palabras = [w for w in row["Representation"][:top_words] if w]
+        pares = []
+        for a, b in combinations(palabras, 2):
+            p_ab = df_count(*sorted((a, b))) / n_docs
+            if p_ab == 0:
+                pares.append(-1.0)
+                continue
+            p_a, p_b = df_count(a) / n_docs, df_count(b) / n_docs
+            pares.append(math.log(p_ab / (p_a * p_b)) / -math.log(p_ab) if p_ab < 1 else 1.0)
+        if pares:
+            scores.append(sum(pares) / len(pares))
+    return sum(scores) / len(scores) if scores else float("nan")
+
+
+# ---------------------------------------------------------
+# 3) UN BACKEND POR PROCESO (memoria pico aislada)
+# ---------------------------------------------------------
+# Sin tracemalloc: frena mucho más el código Python que el nativo y sesgaría la
+# comparación de velocidad. La memoria es ru_maxrss (incluye tensores de
+# torch/onnxruntime; en Linux viene en KB), antes y después del ajuste.
+def _rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_backend(backend: str, docs: list[str], queue) -> None:
+    try:
+        base = _rss_mb()
+        t0 = time.perf_counter()
+        topics, _, info, _ = topic_backends.fit(docs, NR_TOPICS, backend)
+        elapsed = time.perf_counter() - t0
+        pico = _rss_mb()
+        queue.put({
+            "backend":       backend,
+            "segundos":      round(elapsed, 2),
+            "docs/s":        round(len(docs) / elapsed, 1),
+            "pico_rss_MB":   pico,
+            "ajuste_rss_MB": round(pico - base, 1),
+            "topicos":       int((info["Topic"] != -1).sum()),
+            "outliers":      round(float((topics == -1).mean()), 4),
+            "npmi":          round(npmi_coherence(docs, info), 4),
+        })
+    except Exception as e:
+        queue.put({"backend": backend, "error": f"{type(e).__name__}: {e}"})
+
+
+def collect(backend: str, proc, queue, timeout: float = TIMEOUT_S) -> dict:
+    """
+    Resultado del proceso hijo; si muere (OOM, import fallido) o se pasa de
+    `timeout`, una fila con el error en lugar de bloquear el benchmark.
+    """
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            return queue.get(timeout=5)
+        except Empty:
+            if not proc.is_alive():
+                try:   # pudo publicar justo antes de terminar
+                    return queue.get(timeout=1)
+                except Empty:
+                    return {"backend": backend, "error": f"el proceso terminó con código {proc.exitcode}"}
+    proc.terminate()
+    return {"backend": backend, "error": f"sin resultado tras {timeout:.0f}s"}
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("uso: python bench_topics.py <YYYY_MM|archivo.csv> [backend ...]")
+    docs = load_docs(sys.argv[1])
+    backends = sys.argv[2:] or list(topic_backends.BACKENDS)
+    print(f"Corpus: {len(docs):,} reseñas NEG ({len(set(docs)):,} distintas), {NR_TOPICS} tópicos")
+
+    ctx = mp.get_context("spawn")
+    filas = []
+    for backend in backends:
+        print(f"→ {backend} …")
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_backend, args=(backend, docs, queue))
+        proc.start()
+        filas.append(collect(backend, proc, queue))
+        proc.join()
+        if "error" in filas[-1]:
+            print(f"   ❌ {filas[-1]['error']}")
+
+    print(pd.DataFrame(filas).set_index("backend").to_string())
+
+
+if __name__ == "__main__":
+    main()
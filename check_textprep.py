@@ -0,0 +1,147 @@
+# check_textprep.py
+# ----------------------------------------
+# Verifica que el motor de preprocesamiento (textprep.py) produzca
+# exactamente lo mismo que la cadena original de clean.py / topics.py
+# sobre una muestra de un mes real, y mide el speedup en esa muestra.
+# Sale con código 1 (y muestra ejemplos) si alguna fila difiere.
+#
+#   python check_textprep.py                      # último mes de RAW_PREFIX en S3
+#   python check_textprep.py 2025_05 --sample 50000
+#   python check_textprep.py reviews.csv          # columna `content` de un CSV raw
+# ----------------------------------------
+
+import re
+import sys
+import time
+import argparse
+from unicodedata import normalize
+
+import pandas as pd
+
+from textprep import (
+    spanish_stopwords, correct_typos_once, normalize_punctuation,
+    remove_stopwords_neg, clean_series, prepare_topic_series,
+)
+
+SAMPLE_SIZE = 20_000
+MAX_EXAMPLES = 5
+
+
+# ---------------------------------------------------------
+# 1) IMPLEMENTACIÓN ORIGINAL (referencia)
+# ---------------------------------------------------------
+def reference_clean(txt):
+    # copia de clean._clean antes del motor compartido
+    txt = str(txt).lower()
+    txt = normalize("NFKD", txt)
+    txt = "".join(ch for ch in txt if not re.match(r'[\u0300-\u036f]', ch))
+    txt = re.sub(r"[^\w\s]", " ", txt)
+    toks = [w for w in txt.split() if w not in spanish_stopwords and len(w) > 2]
+    return " ".join(toks)
+
+
+def reference_topics(col: pd.Series) -> pd.DataFrame:
+    # copia de la cadena de apply_topics antes del motor compartido
+    norm = (
+        col.fillna("")
+           .astype(str)
+           .str.lower()
+           .apply(correct_typos_once)
+           .apply(normalize_punctuation)
+    )
+    return pd.DataFrame({
+        "content_clean": norm,
+        "content_topic": norm.apply(remove_stopwords_neg),
+        "token_count":   norm.str.split().apply(len),
+    })
+
+
+# ---------------------------------------------------------
+# 2) MUESTRA DE UN MES REAL
+# ---------------------------------------------------------
+def load_sample(origen: str | None, n: int, seed: int = 0) -> pd.Series:
+    """
+    `content` de un CSV local o del mes raw `origen` (por defecto el último);
+    muestra aleatoria de filas, así que conserva la duplicación real del mes.
+    """
+    if origen and origen.endswith(".csv"):
+        df = pd.read_csv(origen)
+    else:
+        import io
+        from apps import app
+        from storage import s3, list_months
+        mes = origen or list_months(app.RAW_PREFIX)[-1]
+        key = f"{app.RAW_PREFIX}/{mes}/reviews_{mes}.csv"
+        df = pd.read_csv(io.BytesIO(s3.get_object(Bucket=app.BUCKET, Key=key)["Body"].read()))
+        print(f"Mes {mes}: s3://{app.BUCKET}/{key}")
+    raw = df["content"]
+    return raw.sample(n=n, random_state=seed).reset_index(drop=True) if len(raw) > n else raw
+
+
+# ---------------------------------------------------------
+# 3) EQUIVALENCIA Y TIEMPOS
+# ---------------------------------------------------------
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def mismatches(nombre: str, raw: pd.Series, ref: pd.Series, new: pd.Series) -> int:
+    distintas = ~(ref.reset_index(drop=True) == new.reset_index(drop=True))
+    for i in distintas[distintas].index[:MAX_EXAMPLES]:
+        print(f"   ❌ {nombre} fila {i}: {raw.iloc[i]!r}\n      original={ref.iloc[i]!r}\n      motor   ={new.iloc[i]!r}")
+    return int(distintas.sum())
+
+
+def check(raw: pd.Series) -> bool:
+    """
+    Compara ambas cadenas fila por fila; True si todas coinciden.
+    """
+    ref_clean = raw.apply(reference_clean)
+    errores = mismatches("clean", raw, ref_clean, clean_series(raw))
+
+    # topics.py corre sobre content_clean (la salida de clean)
+    ref_top = reference_topics(ref_clean)
+    new_top = prepare_topic_series(ref_clean)
+    for col in ("content_clean", "content_topic", "token_count"):
+        errores += mismatches(col, raw, ref_top[col], new_top[col])
+    return errores == 0
+
+
+def speedups(raw: pd.Series) -> None:
+    """
+    Speedup sobre todas las filas de la muestra y solo sobre textos distintos
+    (sin duplicados el motor no se beneficia de la deduplicación).
+    """
+    for etiqueta, serie in (("todas las filas", raw), ("textos distintos", pd.Series(raw.dropna().unique(), dtype=object))):
+        ref_clean, t_ref_clean = timed(lambda s: s.apply(reference_clean), serie)
+        _,         t_new_clean = timed(clean_series, serie)
+        _,         t_ref_top   = timed(reference_topics, ref_clean)
+        _,         t_new_top   = timed(prepare_topic_series, ref_clean)
+        print(f"— {etiqueta} ({len(serie):,})")
+        for nombre, t_ref, t_new in (("clean  ", t_ref_clean, t_new_clean), ("topics ", t_ref_top, t_new_top)):
+            print(
+                f"{nombre} original {t_ref:7.3f}s ({len(serie)/t_ref:10,.0f} filas/s) | "
+                f"motor {t_new:7.3f}s ({len(serie)/t_new:10,.0f} filas/s) | x{t_ref/t_new:.1f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equivalencia y speedup de textprep sobre un mes real")
+    parser.add_argument("origen", nargs="?", help="YYYY_MM de RAW_PREFIX o archivo .csv")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="filas de la muestra")
+    args = parser.parse_args(argv)
+
+    raw = load_sample(args.origen, args.sample)
+    dup = 1 - raw.nunique(dropna=False) / max(len(raw), 1)
+    print(f"Muestra: {len(raw):,} reseñas ({raw.nunique():,} distintas, {dup:.0%} duplicadas)")
+
+    if not check(raw):
+        sys.exit("❌ El motor difiere de la implementación original")
+    print("✅ Salidas idénticas a la implementación original")
+    speedups(raw)
+
+
+if __name__ == "__main__":
+    main()
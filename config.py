@@ -1,5 +1,8 @@
 # config.py Esp
 
+# — Versión del pipeline (forma parte de la huella de cada etapa) —
+PIPELINE_VERSION = "2.0"
+
 # — Play Store app ID —
 APP_ID     = "com.bbva.bbvacontigo"
 
@@ -23,6 +26,10 @@ RAW_CLEAN_KEY = f"{CLEAN_PREFIX}/reviews_new.csv"
 # — Fase 3: sentimiento —
 MODEL_KEY     = "models/model_logreg_bal.pkl"  # pipeline balanceado en S3
 MODEL_KEY_V2 = "models/model_logreg_bal_v2.pkl"  # modelo binario (pos/neg)
+SENTIMENT_CACHE_SIZE = 50_000   # textos normalizados memorizados por score_texts (LRU)
+SENTIMENT_BATCH_SIZE = 1_024    # textos por micro-lote al llamar al modelo
+SENTIMENT_WORKERS    = 1        # procesos (spawn) para inferencia; None = todos los núcleos
+SENTIMENT_CHUNK_SIZE = 20_000   # textos únicos por tarea del pool de inferencia
 
 
 # — Fase 3 output —
@@ -31,6 +38,37 @@ ENRICHED_KEY  = f"{CLEAN_PREFIX}/reviews_with_sentiment.csv"
 
 SENTIMENT_PREFIX = "sentimientos"
 TOPICS_PREFIX    = "topicos"
+EMBEDDING_MODEL  = "all-MiniLM-L6-v2"      # encoder de BERTopic (el default de la librería)
+
+# — Fase 4: backend de tópicos (mismo contrato topic_id/topic_label) —
+# "bertopic": sentence-transformers + UMAP + HDBSCAN (calidad completa)
+# "onnx":     BERTopic con encoder multilingüe pequeño exportado a ONNX int8
+# "tfidf":    TF-IDF + TruncatedSVD + MiniBatchKMeans (sin embeddings, el más rápido)
+TOPIC_BACKEND        = "bertopic"
+ONNX_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+ONNX_MODEL_FILE      = "onnx/model_quint8_avx2.onnx"   # export del hub: quint8 en AVX2; qint8 es arm64/avx512
+TFIDF_MAX_FEATURES   = 20_000
+TFIDF_SVD_COMPONENTS = 100
+
+# — Fase 4: probabilidades de tópico —
+# "assigned": solo la probabilidad del tópico asignado por documento (sin matriz densa)
+# "dense":    matriz documento × tópico completa (calculate_probabilities=True)
+# Con BERTopic, en "assigned" topic_prob/score son la fuerza de pertenencia HDBSCAN
+# al cluster asignado, no la probabilidad suave de "dense" (no comparables entre modos)
+TOPIC_PROBABILITIES = "assigned"
+TOPIC_PROB_TOP_K    = 0        # >0 agrega los k tópicos más probables por documento (topic_topk)
+TOPIC_PROB_CHUNK    = 4_096    # filas por bloque al calcular el top-k sin matriz densa
+
+# — Fase 4: modo de tópicos —
+# "monthly": re-entrena BERTopic sobre un solo mes (≥300 reseñas)
+# "rolling": modelo en línea sobre los últimos ROLLING_MONTHS meses; cada corrida
+#            solo incorpora reseñas nuevas y los topic_id son comparables entre meses
+TOPIC_MODE           = "monthly"
+ROLLING_MONTHS       = 6
+ROLLING_MODEL_PREFIX = "models/topics_rolling"        # un modelo por sentimiento (pos/neg)
+ROLLING_CLUSTERS     = {"pos": 20, "neg": 30}
+ROLLING_DECAY        = 0.01   # olvido del vocabulario por partial_fit (OnlineCountVectorizer)
+ROLLING_COMPONENTS   = 5      # dimensiones de IncrementalPCA (reemplaza a UMAP en el modelo en línea)
 TOPIC_MODEL_KEY = "models/lda.model"       # metadatos del modelo
 DICT_KEY        = "models/lda.dict"        # diccionario gensim
 
@@ -38,3 +76,52 @@ PRIORITY_PREFIX = "prioridad/playstore"
 
 TOPICS_PREFIX   = "topicos/playstore"
 PRIORITY_PREFIX = "prioridad/playstore"
+CUBE_PREFIX     = "cubos/playstore"       # cubo tópico × sentimiento × versión × día × estrellas (Parquet, sección 3 del dashboard)
+
+# — Fase 5: prioridad del backlog (tópicos negativos) —
+PRIORITY_STATE_KEY     = f"{PRIORITY_PREFIX}/state.json"      # agregados parciales por mes
+PRIORITY_TOP_KEY       = f"{PRIORITY_PREFIX}/top_issues.csv"  # tabla top-k para el dashboard
+PRIORITY_TOP_K         = 20
+PRIORITY_HALF_LIFE_DAYS = 30    # vida media del decaimiento por recencia
+PRIORITY_WEIGHTS = {            # pesos de severidad (se multiplican por log(1 + frecuencia))
+    "negativity":    0.5,       # 1 - prob_pos promedio
+    "stars":         0.3,       # (5 - calificación promedio) / 4
+    "concentration": 0.2,       # participación de la versión dominante
+}
+
+# — Dashboard: memoización de vistas filtradas (LRU) —
+VIEW_CACHE_MAX_ENTRIES = 32     # combinaciones de filtros retenidas
+VIEW_CACHE_MAX_MB      = 512    # tope de memoria de vistas + agregados
+
+# — Capa de consultas (query.py): Parquet + DuckDB sobre las salidas mensuales —
+QUERY_PARQUET      = True      # sentimiento y tópicos suben también {archivo}.parquet junto al CSV
+QUERY_THREADS      = 4         # hilos de DuckDB por conexión
+QUERY_MEMORY_LIMIT = "1GB"     # tope de memoria de DuckDB (agregaciones y ordenamientos)
+
+# — Orquestador: huellas de entrada por etapa —
+STATE_KEY = "pipeline/state.json"   # última huella y salidas de cada etapa
+
+# — Perfilado por etapa (o PIPELINE_PROFILE=1) —
+PIPELINE_PROFILE = False
+PROFILE_PREFIX   = "pipeline/profiles"   # índice por corrida; los reportes van junto a las salidas
+PROFILE_TOP_N    = 30                    # funciones / asignaciones por reporte
+
+# — Runner local: tareas (etapa, mes, partición) en un pool de procesos —
+RUNNER_DB              = "pipeline_jobs.sqlite"   # tabla de trabajos para reanudar corridas
+RUNNER_WORKERS         = None    # None = todos los núcleos
+RUNNER_RETRIES         = 2       # reintentos por tarea antes de marcarla como fallida
+RUNNER_RETRY_DELAY_S   = 10      # espera base entre reintentos (se duplica en cada intento)
+RUNNER_SENTIMENT_PARTS = 1       # particiones por texto único de cada mes; >1 solo si el modelo es caro
+                                 # (cada parte descarga el CSV del mes y arranca con la caché vacía)
+
+# — Multi-app: varias apps en un mismo proceso (orchestrator.run_apps) —
+# Cada app define al menos name y app_id; bucket y root son opcionales. Con
+# root, todos sus prefijos quedan bajo "{root}/..." (necesario si comparten bucket).
+# Lista vacía = solo la app de arriba (APP_ID, BUCKET y prefijos tal cual).
+APPS = [
+    # {"name": "esp", "app_id": APP_ID, "bucket": BUCKET},
+    # {"name": "mx",  "app_id": "com.bancomer.mbanking", "bucket": BUCKET, "root": "mx"},
+]
+APP_MAX_CONCURRENCY     = 4        # apps ejecutándose a la vez (hilos)
+MODEL_BUCKET            = BUCKET   # bucket del modelo de sentimiento compartido por todas las apps
+S3_MAX_POOL_CONNECTIONS = 50       # conexiones del cliente S3 compartido entre hilos
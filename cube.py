@@ -0,0 +1,64 @@
+# cube.py
+
+import pandas as pd
+
+from labels import clean_label, EXCLUDED_LABELS
+
+# Dimensiones del cubo de conteos. `score` (estrellas) se incluye para que el
+# filtro de calificación mínima del dashboard también se resuelva sobre el cubo.
+CUBE_DIMS = ["topic_id", "topic_label", "sentiment_pred", "appVersion", "review_date", "score"]
+
+
+def build_topic_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Conteo de reseñas por (tópico, sentimiento, versión, día, estrellas) con la
+    etiqueta legible ya resuelta en `topic_name`. Excluye outliers y comentarios cortos.
+    """
+    base = df[~df["topic_label"].isin(EXCLUDED_LABELS)]
+    cube = (
+        base
+        .groupby(CUBE_DIMS, dropna=False)
+        .size()
+        .reset_index(name="conteo")
+    )
+    nombres = {t: clean_label(t) for t in cube["topic_label"].unique()}
+    cube["topic_name"] = cube["topic_label"].map(nombres)
+    return cube
+
+
+def topic_tables(cube: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Tablas de la sección "Temas más hablados" (POS, NEG) a partir de un cubo filtrado:
+    conteo por tópico y la versión con más reseñas por tópico/sentimiento.
+    """
+    agg = (
+        cube
+        .groupby(["topic_id", "topic_label", "topic_name", "sentiment_pred"])["conteo"]
+        .sum()
+        .reset_index()
+    )
+    top_version = (
+        cube
+        .groupby(["topic_id", "sentiment_pred", "appVersion"])["conteo"]
+        .sum()
+        .reset_index(name="version_count")
+        .sort_values(["topic_id", "sentiment_pred", "version_count"], ascending=[True, True, False])
+        .drop_duplicates(subset=["topic_id", "sentiment_pred"])
+        .loc[:, ["topic_id", "sentiment_pred", "appVersion"]]
+        .rename(columns={"appVersion": "version"})
+    )
+
+    tablas = []
+    for sent in ("POS", "NEG"):
+        df_topics = (
+            agg[agg["sentiment_pred"].str.upper() == sent]
+            .merge(top_version[top_version["sentiment_pred"].str.upper() == sent],
+                   on=["topic_id", "sentiment_pred"], how="left")
+            .sort_values("conteo", ascending=False)
+            .copy()
+        )
+        df_topics["Tópico"] = df_topics["topic_name"]
+        df_topics["# de reseñas"] = df_topics["conteo"]
+        df_topics["version"] = df_topics["version"].fillna("n/a")
+        tablas.append(df_topics)
+    return tablas[0], tablas[1]
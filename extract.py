@@ -2,12 +2,14 @@
 
 import io
 import pandas as pd
-import boto3
 import time
 from datetime import datetime, timedelta, timezone
 from google_play_scraper import reviews, Sort
 
-from config import APP_ID, BUCKET, RAW_PREFIX, WINDOW_DAYS
+from config import WINDOW_DAYS
+from apps import app
+from storage import s3, CSV_DTYPES
+from manifest import record_month
 
 # Zona horaria CDMX
 TZ_MX = timezone(timedelta(hours=-6))
@@ -35,7 +37,7 @@ def extract_reviews():
     # 2) Paginación y filtrado manual
     while True:
         filas, token_next = reviews(
-            APP_ID,
+            app.APP_ID,
             lang="es",
             country="mx",
             sort=Sort.NEWEST,
@@ -80,13 +82,12 @@ def extract_reviews():
 
     # 4) Agrupar por mes y subir CSVs
     df["mes"] = pd.to_datetime(df["at"]).dt.strftime("%Y_%m")
-    s3 = boto3.client("s3")
 
     for ym, grupo in df.groupby("mes"):
-        key = f"{RAW_PREFIX}/{ym}/reviews_{ym}.csv"
+        key = f"{app.RAW_PREFIX}/{ym}/reviews_{ym}.csv"
         try:
-            obj = s3.get_object(Bucket=BUCKET, Key=key)
-            prev = pd.read_csv(io.BytesIO(obj["Body"].read()))
+            obj = s3.get_object(Bucket=app.BUCKET, Key=key)
+            prev = pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=CSV_DTYPES)
             print(f"   • Archivo existente encontrado para {ym}, fusionando...")
         except s3.exceptions.NoSuchKey:
             prev = pd.DataFrame()
@@ -98,13 +99,18 @@ def extract_reviews():
         if not prev.empty:
             merged = pd.concat([prev, grupo.drop(columns=["mes"])], ignore_index=True)
             merged = merged.drop_duplicates(subset=["reviewId"])
+            # Sin reseñas nuevas: no se reescribe el archivo y su ETag no cambia
+            if len(merged) == len(prev):
+                print(f"   • Sin reseñas nuevas para {ym}, se conserva el archivo actual.")
+                continue
         else:
             merged = grupo.drop(columns=["mes"])
 
         buf = io.StringIO()
         merged.to_csv(buf, index=False, encoding="utf-8")
-        s3.put_object(Bucket=BUCKET, Key=key, Body=buf.getvalue())
-        print(f"✓ {len(merged):,} reseñas subidas → s3://{BUCKET}/{key}")
+        resp = s3.put_object(Bucket=app.BUCKET, Key=key, Body=buf.getvalue())
+        record_month(app.RAW_PREFIX, ym, merged, key, resp["ETag"].strip('"'))
+        print(f"✓ {len(merged):,} reseñas subidas → s3://{app.BUCKET}/{key}")
 
 if __name__ == "__main__":
     extract_reviews()
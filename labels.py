@@ -0,0 +1,15 @@
+# labels.py
+
+import re
+
+
+def clean_label(label: str) -> str:
+    """
+    Nombre legible de un tópico de BERTopic: "3_token_no_llega" → "Token No Llega".
+    """
+    text = re.sub(r'^\d+_', '', str(label))
+    return text.replace('_',' ').title()
+
+
+# Etiquetas que no son tópicos reales (se excluyen de rankings y tablas)
+EXCLUDED_LABELS = {"outlier", "Comentario Corto"}
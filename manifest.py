@@ -0,0 +1,95 @@
+# manifest.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+from storage import read_json, write_json
+
+
+# ---------------------------------------------------------
+# Manifiesto por prefijo: {prefix}/_manifest.json
+# {"months": {"2025_05": {"key", "etag", "rows", "date_min", "date_max", "sentiment"}}}
+# ---------------------------------------------------------
+def manifest_key(prefix: str) -> str:
+    return f"{prefix}/_manifest.json"
+
+
+def load_manifest(prefix: str) -> dict:
+    """
+    Resumen por mes del prefijo ({} si todavía no existe manifiesto).
+    """
+    data = read_json(manifest_key(prefix), default={}) or {}
+    return data.get("months", {})
+
+
+def save_manifest(prefix: str, months: dict) -> None:
+    write_json(manifest_key(prefix), {"months": dict(sorted(months.items()))})
+
+
+def summarize_month(df: pd.DataFrame, key: str, etag: str | None) -> dict:
+    """
+    Resumen de un CSV mensual: filas, rango de fechas y conteos de sentimiento.
+    """
+    info = {"key": key, "etag": etag, "rows": int(len(df))}
+    if "at" in df.columns and len(df):
+        fechas = pd.to_datetime(df["at"], errors="coerce")
+        info["date_min"] = str(fechas.min().date()) if fechas.notna().any() else None
+        info["date_max"] = str(fechas.max().date()) if fechas.notna().any() else None
+    if "sentiment_pred" in df.columns:
+        info["sentiment"] = {
+            str(k): int(v) for k, v in df["sentiment_pred"].value_counts().items()
+        }
+    return info
+
+
+# ---------------------------------------------------------
+# Escrituras diferidas: en los procesos de runner.py varias tareas terminan a
+# la vez y el leer-modificar-escribir de _manifest.json perdería meses. Dentro
+# de deferred() las entradas se acumulan y el proceso padre las aplica.
+# ---------------------------------------------------------
+_diferidas: ContextVar[list | None] = ContextVar("manifest_diferidas", default=None)
+
+
+@contextmanager
+def deferred():
+    entradas = []
+    token = _diferidas.set(entradas)
+    try:
+        yield entradas
+    finally:
+        _diferidas.reset(token)
+
+
+def update_manifest(prefix: str, months: dict) -> None:
+    """
+    Agrega o reemplaza las entradas `months` en el manifiesto de `prefix`.
+    """
+    pendientes = _diferidas.get()
+    if pendientes is not None:
+        pendientes.extend((prefix, ym, info) for ym, info in months.items())
+        return
+    actual = load_manifest(prefix)
+    actual.update(months)
+    save_manifest(prefix, actual)
+
+
+def apply_deferred(entradas: list) -> None:
+    """
+    Aplica entradas acumuladas con deferred(): una lectura y una escritura por prefijo.
+    """
+    por_prefijo = {}
+    for prefix, ym, info in entradas:
+        por_prefijo.setdefault(prefix, {})[ym] = info
+    for prefix, months in por_prefijo.items():
+        update_manifest(prefix, months)
+
+
+def record_month(prefix: str, ym: str, df: pd.DataFrame, key: str, etag: str | None) -> dict:
+    """
+    Actualiza la entrada de `ym` en el manifiesto de `prefix` tras escribir su CSV.
+    """
+    info = summarize_month(df, key, etag)
+    update_manifest(prefix, {ym: info})
+    return info
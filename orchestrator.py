@@ -1,36 +1,212 @@
 # orchestrator.py
 
+import os
+import json
+import hashlib
+import inspect
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import clean
+import sentiment
+import topics
+import topic_backends
+import textprep
+import cube
+import labels
+import config
+import priority
+import runner
 from extract import extract_reviews
 from clean import main as clean_main
 from sentiment import apply_sentiment
 from topics import apply_topics
-from config import PIPELINE_VERSION
+from priority import apply_priority
+from storage import list_months, object_etag, read_json, write_json
+from config import (
+    PIPELINE_VERSION, MODEL_BUCKET, MODEL_KEY_V2, RUNNER_DB, APP_MAX_CONCURRENCY,
+)
+from apps import app, configured_apps, find_app, use_app
+from manifest import load_manifest
+from profiling import profiling_enabled, new_run_id, stage_profiler
+
+# Nota: `priority.py` volvió como etapa incremental (frecuencia × negatividad ×
+# calificación × recencia × concentración por versión); ya no solo frecuencia.
+
+
+# ---------------------------------------------------------
+# 1) HUELLAS DE ENTRADA POR ETAPA
+# ---------------------------------------------------------
+def code_version(*modules) -> str:
+    """
+    Versión del código de una etapa: PIPELINE_VERSION + hash de sus archivos fuente.
+    """
+    h = hashlib.sha256()
+    for module in modules:
+        with open(inspect.getsourcefile(module), "rb") as f:
+            h.update(f.read())
+    return f"{PIPELINE_VERSION}-{h.hexdigest()[:12]}"
+
+
+def _latest_month(prefix: str) -> str | None:
+    meses = list_months(prefix)
+    return meses[-1] if meses else None
+
+
+def _clean_inputs() -> dict:
+    mes = _latest_month(app.RAW_PREFIX)
+    return {
+        "month": mes,
+        "raw":   object_etag(f"{app.RAW_PREFIX}/{mes}/reviews_{mes}.csv") if mes else None,
+        "code":  code_version(clean, textprep),
+    }
+
+
+def _sentiment_inputs() -> dict:
+    mes = _latest_month(app.CLEAN_PREFIX)
+    return {
+        "month": mes,
+        "clean": object_etag(f"{app.CLEAN_PREFIX}/{mes}/clean_reviews_{mes}.csv") if mes else None,
+        "model": object_etag(MODEL_KEY_V2, MODEL_BUCKET),   # el modelo es compartido, no vive en el bucket de la app
+        "code":  code_version(sentiment, textprep),
+    }
+
+
+# ajustes de config.py que cambian las salidas de tópicos; el resto (caché del
+# dashboard, DuckDB, runner, sentimiento) no debe forzar un re-entrenamiento
+TOPIC_SETTINGS = ("TOPIC_", "ROLLING_", "EMBEDDING_", "ONNX_", "TFIDF_", "QUERY_PARQUET")
+
+
+def topic_settings() -> dict:
+    return {
+        name: getattr(config, name) for name in sorted(vars(config))
+        if name.isupper() and name.startswith(TOPIC_SETTINGS)
+    }
+
+
+def _topics_inputs() -> dict:
+    # select_month_with_min_reviews puede retroceder a cualquier mes,
+    # así que la huella incluye todos los CSV de sentimiento
+    return {
+        "sentiment": {
+            mes: object_etag(f"{app.SENTIMENT_PREFIX}/{mes}/reviews_sentiment_{mes}.csv")
+            for mes in list_months(app.SENTIMENT_PREFIX)
+        },
+        "code":     code_version(topics, topic_backends, textprep, cube, labels),
+        "settings": topic_settings(),
+    }
+
+
+def _priority_inputs() -> dict:
+    # la fecha forma parte de la huella: el decaimiento por recencia cambia cada día
+    return {
+        "topics": {mes: info.get("etag") for mes, info in load_manifest(app.TOPICS_PREFIX).items()},
+        "today":  date.today().isoformat(),
+        "code":   code_version(priority),
+    }
+
+
+def fingerprint(inputs: dict) -> str:
+    canon = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
 
-# Nota: se eliminó el uso de `priority.py` ya que la prioridad se calculaba
-# únicamente por frecuencia. El análisis ahora se realiza en el dashboard.
 
-def run_pipeline():
+# ---------------------------------------------------------
+# 2) DAG DE ETAPAS
+# ---------------------------------------------------------
+# inputs=None → la etapa siempre corre (extract depende de la Play Store, no de S3)
+STAGES = {
+    "extract":   {"run": extract_reviews, "deps": [],            "inputs": None},
+    "clean":     {"run": clean_main,      "deps": ["extract"],   "inputs": _clean_inputs},
+    "sentiment": {"run": apply_sentiment, "deps": ["clean"],     "inputs": _sentiment_inputs},
+    "topics":    {"run": apply_topics,    "deps": ["sentiment"], "inputs": _topics_inputs},
+    "priority":  {"run": apply_priority,  "deps": ["topics"],    "inputs": _priority_inputs},
+}
+
+STAGE_LABELS = {
+    "extract":   "Extrayendo reseñas",
+    "clean":     "Limpiando texto",
+    "sentiment": "Aplicando sentimiento",
+    "topics":    "Detectando tópicos",
+    "priority":  "Calculando prioridad del backlog",
+}
+
+
+def stage_order(stages: dict) -> list[str]:
+    """
+    Orden topológico de las etapas según sus dependencias.
+    """
+    orden, visitadas = [], set()
+
+    def visitar(nombre, camino=()):
+        if nombre in visitadas:
+            return
+        if nombre in camino:
+            raise RuntimeError(f"Ciclo en el DAG de etapas: {' → '.join(camino + (nombre,))}")
+        for dep in stages[nombre]["deps"]:
+            visitar(dep, camino + (nombre,))
+        visitadas.add(nombre)
+        orden.append(nombre)
+
+    for nombre in stages:
+        visitar(nombre)
+    return orden
+
+
+def _outputs_exist(keys: list[str]) -> bool:
+    return bool(keys) and all(object_etag(k) is not None for k in keys)
+
+
+def run_pipeline(force: bool | None = None, profile: bool | None = None):
     """
     Función central que ejecuta todo el flujo del pipeline:
     1) Extrae reseñas
     2) Limpia texto
     3) Aplica análisis de sentimientos
     4) Detecta tópicos
+    5) Calcula la prioridad de los tópicos negativos
+    Cada etapa con huella de entrada (ETags de S3, modelo y versión de código)
+    se omite si coincide con la última ejecución y sus salidas siguen en S3.
+    `force=True` (o PIPELINE_FORCE=1) ejecuta todas las etapas.
+    `profile=True` (o PIPELINE_PROFILE=1) guarda cProfile + tracemalloc por etapa
+    junto a sus salidas (ver profiling.py).
     """
+    if force is None:
+        force = os.environ.get("PIPELINE_FORCE", "0") == "1"
+    if profile is None:
+        profile = profiling_enabled()
+    run_id = new_run_id() if profile else None
+
     try:
-        print(f"🟡 Iniciando pipeline v{PIPELINE_VERSION}...")
+        print(f"🟡 Iniciando pipeline v{PIPELINE_VERSION}..." + (f" (perfilando, corrida {run_id})" if profile else ""))
+        state = read_json(app.STATE_KEY, default={}) or {}
 
-        print("➡️ Extrayendo reseñas...")
-        extract_reviews()
+        for nombre in stage_order(STAGES):
+            etapa = STAGES[nombre]
+            print(f"➡️ {STAGE_LABELS.get(nombre, nombre)}...")
 
-        print("➡️ Limpiando texto...")
-        clean_main()
+            huella = None
+            if etapa["inputs"] is not None:
+                huella = fingerprint(etapa["inputs"]())
+                previo = state.get(nombre, {})
+                if (not force
+                        and previo.get("fingerprint") == huella
+                        and _outputs_exist(previo.get("outputs", []))):
+                    print(f"   ⏭️  Entradas sin cambios, se omite '{nombre}'.")
+                    continue
 
-        print("➡️ Aplicando sentimiento...")
-        apply_sentiment()
+            with stage_profiler(nombre, profile) as perfil:
+                salida = etapa["run"]()
+            outputs = [salida] if isinstance(salida, str) else list(salida or [])
+            if perfil is not None:
+                perfil.upload(run_id, outputs)
 
-        print("➡️ Detectando tópicos...")
-        apply_topics()
+            if huella is not None:
+                state[nombre] = {
+                    "fingerprint": huella,
+                    "outputs": outputs,
+                }
+                write_json(app.STATE_KEY, state)
 
         print("✅ Pipeline ejecutado correctamente.")
         return {
@@ -45,12 +221,70 @@ def run_pipeline():
             "body": str(e)
         }
 
+# ---------------------------------------------------------
+# 3) VARIAS APPS EN PARALELO
+# ---------------------------------------------------------
+def run_apps(apps: list[str] | None = None, force: bool | None = None, profile: bool | None = None) -> dict:
+    """
+    Ejecuta run_pipeline para varias apps (config.APPS) a la vez, una por hilo.
+    Cada hilo fija su app con use_app; los modelos de sentimiento, los encoders
+    de tópicos y el cliente S3 se comparten entre hilos en vez de cargarse por app.
+    """
+    cfgs = [find_app(nombre) for nombre in apps] if apps else configured_apps()
+    workers = max(1, min(APP_MAX_CONCURRENCY, len(cfgs)))
+    if profile is None:
+        profile = profiling_enabled()
+    if profile and workers > 1:
+        # cProfile y tracemalloc son globales al proceso: perfilar hilos a la vez mezcla etapas
+        print("⚠️ El perfilado requiere correr las apps de a una; se desactiva con APP_MAX_CONCURRENCY > 1.")
+        profile = False
+
+    def correr(cfg):
+        with use_app(cfg):
+            print(f"📱 [{cfg['name']}] iniciando pipeline...")
+            return run_pipeline(force=force, profile=profile)
+
+    print(f"🟡 Ejecutando {len(cfgs)} app(s) con {workers} en paralelo...")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="app") as pool:
+        resultados = dict(zip((cfg["name"] for cfg in cfgs), pool.map(correr, cfgs)))
+
+    fallidas = [nombre for nombre, r in resultados.items() if r["statusCode"] != 200]
+    if fallidas:
+        print(f"❌ Apps con error: {', '.join(fallidas)}")
+    return {"statusCode": 500 if fallidas else 200, "body": json.dumps(resultados)}
+
+
 def lambda_handler(event=None, context=None):
     """
     Handler oficial para AWS Lambda.
+    - {"task": {"stage": "sentiment", "month": "2025_05"}} ejecuta una sola tarea del runner.
+    - {"runner": {"months": [...], "stages": [...]}} corre el plan por mes en el mismo
+      proceso (Lambda no ofrece /dev/shm para un pool de procesos).
+    - {"apps": ["app_a", "app_b"]} o {"all_apps": true} corre el pipeline de esas apps
+      (o de todas las de config.APPS) en paralelo.
+    - Cualquier otro evento ejecuta el pipeline completo del último mes.
     """
-    return run_pipeline()
+    event = event or {}
+    try:
+        if "task" in event:
+            salida = runner.run_task(**event["task"])
+            return {"statusCode": 200, "body": json.dumps(salida, default=str)}
+        if "runner" in event:
+            resumen = runner.run(workers=1, db_path="/tmp/" + RUNNER_DB, **event["runner"])
+            ok = set(resumen["jobs"]) <= {"done"}
+            return {"statusCode": 200 if ok else 500, "body": json.dumps(resumen)}
+    except Exception as e:
+        print(f"❌ Error en la tarea: {e}")
+        return {"statusCode": 500, "body": str(e)}
+
+    force = bool(event.get("force", False)) or None
+    if event.get("apps") or event.get("all_apps"):
+        return run_apps(event.get("apps"), force=force)
+    return run_pipeline(force=force)
 
 # 🔁 Permite ejecutar el pipeline directamente si se corre localmente
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    if config.APPS:
+        run_apps()
+    else:
+        run_pipeline()
@@ -0,0 +1,208 @@
+# priority.py
+
+import io
+import math
+from datetime import date
+
+import pandas as pd
+
+from config import (
+    PRIORITY_TOP_K, PRIORITY_HALF_LIFE_DAYS, PRIORITY_WEIGHTS,
+)
+from apps import app
+from labels import clean_label, EXCLUDED_LABELS
+from manifest import load_manifest
+from storage import s3, list_months, object_etag, read_json, write_json, CSV_DTYPES
+
+
+# Versión del formato de los parciales en PRIORITY_STATE_KEY; si cambia, se
+# recalculan todos los meses en la siguiente corrida.
+PARTIALS_VERSION = 2
+
+
+# ---------------------------------------------------------
+# 1) AGREGADOS PARCIALES POR MES
+# ---------------------------------------------------------
+def topic_key(topic_id: int, label: str, mode: str | None) -> str:
+    """
+    Llave del tópico para fusionar meses. En modo "monthly" BERTopic se
+    re-entrena cada mes y el id ("3_" en "3_token_no_llega") no se corresponde
+    entre meses, así que se usa el nombre legible; en modo "rolling" el
+    topic_id es estable en toda la ventana.
+    """
+    if mode == "rolling":
+        return f"rolling_{int(topic_id)}"
+    return clean_label(label)
+
+
+def _decay(days: float) -> float:
+    return math.exp(-math.log(2) * days / PRIORITY_HALF_LIFE_DAYS)
+
+
+def month_partials(df: pd.DataFrame) -> dict:
+    """
+    Agregados aditivos por tópico negativo de un mes, por topic_key:
+    n, suma de (1 - prob_pos), suma de estrellas, conteo con decaimiento
+    (referido a `ref_date`, la última fecha del mes) y conteos por versión.
+    """
+    neg = df[
+        (df["sentiment_pred"].astype(str).str.lower() == "neg")
+        & (df["topic_id"] != -1)
+        & ~df["topic_label"].isin(EXCLUDED_LABELS)
+    ]
+    if neg.empty:
+        return {"ref_date": None, "topics": {}}
+
+    fechas   = pd.to_datetime(neg["review_date"], errors="coerce")
+    ref_date = fechas.max()
+    edad     = (ref_date - fechas).dt.days.fillna(0)
+    neg = neg.assign(
+        _neg=1 - neg["prob_pos"].astype(float),
+        _w=[_decay(d) for d in edad],
+        _version=neg["appVersion"].fillna("n/a").astype(str),
+        _fecha=fechas.dt.date.astype(str),
+    )
+    modos = neg["topic_mode"] if "topic_mode" in neg.columns else pd.Series(None, index=neg.index)
+    neg = neg.assign(_key=[topic_key(t, l, m) for t, l, m in zip(neg["topic_id"], neg["topic_label"], modos)])
+
+    topics = {}
+    for key, g in neg.groupby("_key"):
+        principal = g["topic_label"].value_counts().index[0]
+        topics[key] = {
+            "topic_id":    int(g.loc[g["topic_label"] == principal, "topic_id"].iloc[0]),
+            "topic_label": principal,
+            "n":           int(len(g)),
+            "sum_neg":   float(g["_neg"].sum()),
+            "sum_stars": float(g["score"].astype(float).sum()),
+            "decayed":   float(g["_w"].sum()),
+            "last_seen": g["_fecha"].max(),
+            "versions":  {str(k): int(v) for k, v in g["_version"].value_counts().items()},
+        }
+    return {"ref_date": str(ref_date.date()), "topics": topics}
+
+
+def read_topics_month(key: str) -> pd.DataFrame:
+    obj = s3.get_object(Bucket=app.BUCKET, Key=key)
+    cols = ["review_date", "sentiment_pred", "prob_pos", "score", "appVersion", "topic_id", "topic_label", "topic_mode"]
+    return pd.read_csv(io.BytesIO(obj["Body"].read()), usecols=lambda c: c in cols, dtype=CSV_DTYPES)
+
+
+# ---------------------------------------------------------
+# 2) FUSIÓN Y PUNTAJE
+# ---------------------------------------------------------
+def rank_topics(partials: dict, today: date | None = None, top_k: int = PRIORITY_TOP_K) -> pd.DataFrame:
+    """
+    Fusiona los parciales de todos los meses y calcula:
+    priority = log(1 + frecuencia con decaimiento) ×
+               (w_neg·negatividad + w_stars·severidad + w_conc·concentración de versión)
+    El decaimiento guardado por mes se re-escala a `today` (es multiplicativo).
+    Los meses se fusionan por topic_key; topic_id y etiqueta son los del mes más reciente.
+    """
+    today = today or date.today()
+    merged = {}
+    for _, mes in sorted(partials.items()):
+        if not mes.get("ref_date"):
+            continue
+        factor = _decay((today - date.fromisoformat(mes["ref_date"])).days)
+        for key, t in mes["topics"].items():
+            m = merged.setdefault(key, {
+                "n": 0, "sum_neg": 0.0, "sum_stars": 0.0,
+                "decayed": 0.0, "last_seen": "", "versions": {},
+            })
+            m["topic_id"]    = t["topic_id"]
+            m["topic_label"] = t["topic_label"]
+            m["n"]         += t["n"]
+            m["sum_neg"]   += t["sum_neg"]
+            m["sum_stars"] += t["sum_stars"]
+            m["decayed"]   += t["decayed"] * factor
+            m["last_seen"]  = max(m["last_seen"], t["last_seen"])
+            for v, c in t["versions"].items():
+                m["versions"][v] = m["versions"].get(v, 0) + c
+
+    rows = []
+    for m in merged.values():
+        top_version, top_count = max(m["versions"].items(), key=lambda kv: kv[1])
+        negativity    = m["sum_neg"] / m["n"]
+        avg_stars     = m["sum_stars"] / m["n"]
+        concentration = top_count / m["n"]
+        severity = (
+            PRIORITY_WEIGHTS["negativity"] * negativity
+            + PRIORITY_WEIGHTS["stars"] * (5 - avg_stars) / 4
+            + PRIORITY_WEIGHTS["concentration"] * concentration
+        )
+        rows.append({
+            "topic_id":          m["topic_id"],
+            "topic_label":       m["topic_label"],
+            "topic_name":        clean_label(m["topic_label"]),
+            "frequency":         m["n"],
+            "frequency_decayed": round(m["decayed"], 2),
+            "negativity":        round(negativity, 4),
+            "avg_stars":         round(avg_stars, 2),
+            "top_version":       top_version,
+            "version_share":     round(concentration, 4),
+            "last_seen":         m["last_seen"],
+            "priority":          round(math.log1p(m["decayed"]) * severity, 4),
+        })
+
+    cols = ["rank", "topic_id", "topic_label", "topic_name", "frequency", "frequency_decayed",
+            "negativity", "avg_stars", "top_version", "version_share", "last_seen", "priority"]
+    if not rows:
+        return pd.DataFrame(columns=cols)
+    df = (
+        pd.DataFrame(rows)
+        .sort_values("priority", ascending=False)
+        .head(top_k)
+        .reset_index(drop=True)
+    )
+    df.insert(0, "rank", range(1, len(df) + 1))
+    return df[cols]
+
+
+# ---------------------------------------------------------
+# 3) PUNTO CENTRAL: apply_priority()
+# ---------------------------------------------------------
+def apply_priority():
+    """
+    1) Lee el manifiesto de TOPICS_PREFIX (ETag por mes; HEAD para meses previos al manifiesto).
+    2) Recalcula los parciales solo de los meses cuyo CSV de tópicos cambió
+       (el modelo re-entrena el mes completo, así que el mes es la unidad nueva).
+    3) Fusiona parciales, re-escala el decaimiento a hoy y guarda el top-k.
+    """
+    manifest = load_manifest(app.TOPICS_PREFIX)
+    # meses de tópicos escritos antes del manifiesto: se identifican por su ETag
+    for mes in list_months(app.TOPICS_PREFIX):
+        if mes not in manifest:
+            key = f"{app.TOPICS_PREFIX}/{mes}/topics_{mes}.csv"
+            manifest[mes] = {"key": key, "etag": object_etag(key)}
+    manifest = {m: info for m, info in manifest.items() if info.get("etag")}
+    if not manifest:
+        raise RuntimeError(f"No hay CSV de tópicos en s3://{app.BUCKET}/{app.TOPICS_PREFIX}/")
+
+    state  = read_json(app.PRIORITY_STATE_KEY, default={}) or {}
+    # parciales de un formato anterior (llave = etiqueta cruda) se recalculan
+    months = state.get("months", {}) if state.get("version") == PARTIALS_VERSION else {}
+
+    # meses que ya no existen en tópicos se descartan
+    for mes in set(months) - set(manifest):
+        months.pop(mes)
+
+    nuevos = [m for m, info in sorted(manifest.items()) if months.get(m, {}).get("etag") != info["etag"]]
+    for mes in nuevos:
+        df = read_topics_month(manifest[mes]["key"])
+        months[mes] = {"etag": manifest[mes]["etag"], **month_partials(df)}
+        print(f"   • Prioridad: {mes} recalculado ({len(df):,} filas)")
+    if not nuevos:
+        print("   • Prioridad: sin meses nuevos, solo se re-escala la recencia")
+
+    write_json(app.PRIORITY_STATE_KEY, {"version": PARTIALS_VERSION, "months": months})
+
+    top = rank_topics(months)
+    buf = io.StringIO()
+    top.to_csv(buf, index=False, encoding="utf-8")
+    s3.put_object(Bucket=app.BUCKET, Key=app.PRIORITY_TOP_KEY, Body=buf.getvalue())
+    print(f"✓ Top {len(top)} temas a solucionar subido a s3://{app.BUCKET}/{app.PRIORITY_TOP_KEY}")
+    return app.PRIORITY_TOP_KEY
+
+
+if __name__ == "__main__":
+    apply_priority()
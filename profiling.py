@@ -0,0 +1,217 @@
+# profiling.py
+# ----------------------------------------
+# Perfilado opcional de CPU (cProfile) y memoria (tracemalloc) por etapa.
+# Se activa con PIPELINE_PROFILE=1 o config.PIPELINE_PROFILE; apagado no
+# agrega ningún costo (run_pipeline usa un contexto vacío).
+#
+# Por etapa se escriben, junto a sus salidas en S3:
+#   {carpeta}/_profiles/{run_id}/{etapa}.pstats      → pstats binario
+#   {carpeta}/_profiles/{run_id}/{etapa}_top.txt     → funciones más costosas
+#   {carpeta}/_profiles/{run_id}/{etapa}_mem.json    → pico y top de asignaciones
+# y un índice en {PROFILE_PREFIX}/{run_id}/index.json para encontrarlos.
+#
+#   python profiling.py runs                           # corridas perfiladas
+#   python profiling.py diff RUN_A RUN_B               # todas las etapas
+#   python profiling.py diff RUN_A RUN_B --stage topics --top 15
+# ----------------------------------------
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import argparse
+import tracemalloc
+import posixpath
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from config import PIPELINE_PROFILE, PROFILE_TOP_N
+from apps import app
+from storage import s3, read_json, write_json
+
+
+def profiling_enabled() -> bool:
+    env = os.environ.get("PIPELINE_PROFILE")
+    return env == "1" if env is not None else bool(PIPELINE_PROFILE)
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%dT%H%M%S")
+
+
+# ---------------------------------------------------------
+# 1) CAPTURA POR ETAPA
+# ---------------------------------------------------------
+class StageProfile:
+    """
+    Resultado de perfilar una etapa: pstats, pico de memoria y top de asignaciones.
+    """
+
+    def __init__(self, stage: str):
+        self.stage    = stage
+        self.profiler = cProfile.Profile()
+        self.seconds  = 0.0
+        self.peak     = 0
+        self.top_allocs = []
+
+    def top_functions(self, n: int = PROFILE_TOP_N) -> str:
+        buf = io.StringIO()
+        pstats.Stats(self.profiler, stream=buf).sort_stats("cumulative").print_stats(n)
+        return buf.getvalue()
+
+    def pstats_bytes(self) -> bytes:
+        tmp = f"/tmp/profile_{self.stage}_{os.getpid()}.pstats"
+        self.profiler.dump_stats(tmp)
+        with open(tmp, "rb") as f:
+            data = f.read()
+        os.remove(tmp)
+        return data
+
+    def upload(self, run_id: str, outputs: list[str]) -> dict:
+        """
+        Sube los reportes junto a la primera salida de la etapa (o a PROFILE_PREFIX
+        si la etapa no reporta salidas) y los registra en el índice de la corrida.
+        """
+        if outputs:
+            carpeta = f"{posixpath.dirname(outputs[0])}/_profiles/{run_id}"
+        else:
+            carpeta = f"{app.PROFILE_PREFIX}/{run_id}"
+        keys = {
+            "pstats": f"{carpeta}/{self.stage}.pstats",
+            "top":    f"{carpeta}/{self.stage}_top.txt",
+            "mem":    f"{carpeta}/{self.stage}_mem.json",
+        }
+        s3.put_object(Bucket=app.BUCKET, Key=keys["pstats"], Body=self.pstats_bytes())
+        s3.put_object(Bucket=app.BUCKET, Key=keys["top"], Body=self.top_functions().encode("utf-8"))
+        write_json(keys["mem"], {
+            "stage": self.stage, "seconds": round(self.seconds, 3),
+            "peak_mb": round(self.peak / 2**20, 2), "top_allocations": self.top_allocs,
+        })
+
+        index_key = f"{app.PROFILE_PREFIX}/{run_id}/index.json"
+        index = read_json(index_key, default={}) or {}
+        index[self.stage] = {**keys, "seconds": round(self.seconds, 3), "peak_mb": round(self.peak / 2**20, 2)}
+        write_json(index_key, index)
+        print(f"   📈 Perfil de '{self.stage}': {self.seconds:.1f}s, pico {self.peak / 2**20:.0f} MB "
+              f"→ s3://{app.BUCKET}/{carpeta}/")
+        return keys
+
+
+@contextmanager
+def _profile(stage: str):
+    prof = StageProfile(stage)
+    ya_activo = tracemalloc.is_tracing()
+    if not ya_activo:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    prof.profiler.enable()
+    try:
+        yield prof
+    finally:
+        prof.profiler.disable()
+        prof.seconds = time.perf_counter() - t0
+        _, prof.peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        prof.top_allocs = [
+            {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+             "size_kb": round(s.size / 1024, 1), "count": s.count}
+            for s in snapshot.statistics("lineno")[:PROFILE_TOP_N]
+        ]
+        if not ya_activo:
+            tracemalloc.stop()
+
+
+def stage_profiler(stage: str, enabled: bool):
+    """
+    Contexto de perfilado de una etapa; con `enabled=False` es un contexto vacío
+    (sin cProfile ni tracemalloc) y devuelve None.
+    """
+    return _profile(stage) if enabled else nullcontext()
+
+
+# ---------------------------------------------------------
+# 2) COMPARACIÓN DE DOS CORRIDAS
+# ---------------------------------------------------------
+def load_run(run_id: str) -> dict:
+    index = read_json(f"{app.PROFILE_PREFIX}/{run_id}/index.json")
+    if index is None:
+        raise RuntimeError(f"No hay perfiles para la corrida {run_id} en s3://{app.BUCKET}/{app.PROFILE_PREFIX}/")
+    return index
+
+
+def load_stats(key: str) -> pstats.Stats:
+    tmp = "/tmp/" + key.replace("/", "_")
+    s3.download_file(app.BUCKET, key, tmp)
+    return pstats.Stats(tmp, stream=io.StringIO())
+
+
+def function_times(stats: pstats.Stats) -> dict:
+    """
+    (archivo:línea(función)) -> (tiempo propio, tiempo acumulado, llamadas).
+    """
+    return {
+        f"{posixpath.basename(f)}:{line}({fn})": (tt, ct, nc)
+        for (f, line, fn), (cc, nc, tt, ct, callers) in stats.stats.items()
+    }
+
+
+def diff_stage(a: dict, b: dict, stage: str, top: int) -> None:
+    print(f"\n=== {stage}: {a['seconds']:.2f}s → {b['seconds']:.2f}s "
+          f"({b['seconds'] - a['seconds']:+.2f}s) | pico {a['peak_mb']:.0f} → {b['peak_mb']:.0f} MB ===")
+
+    fa = function_times(load_stats(a["pstats"]))
+    fb = function_times(load_stats(b["pstats"]))
+    filas = []
+    for fn in fa.keys() | fb.keys():
+        tt_a, ct_a, nc_a = fa.get(fn, (0.0, 0.0, 0))
+        tt_b, ct_b, nc_b = fb.get(fn, (0.0, 0.0, 0))
+        filas.append((tt_b - tt_a, ct_b - ct_a, tt_a, tt_b, nc_a, nc_b, fn))
+    filas.sort(key=lambda r: abs(r[0]), reverse=True)
+    print(f"{'Δ propio':>10} {'Δ acum':>10} {'propio A':>10} {'propio B':>10} {'llamadas A→B':>16}  función")
+    for d_tt, d_ct, tt_a, tt_b, nc_a, nc_b, fn in filas[:top]:
+        print(f"{d_tt:+10.3f} {d_ct:+10.3f} {tt_a:10.3f} {tt_b:10.3f} {f'{nc_a}→{nc_b}':>16}  {fn}")
+
+    ma = {x["where"]: x["size_kb"] for x in read_json(a["mem"], default={}).get("top_allocations", [])}
+    mb = {x["where"]: x["size_kb"] for x in read_json(b["mem"], default={}).get("top_allocations", [])}
+    mem = sorted(((mb.get(w, 0) - ma.get(w, 0), w) for w in ma.keys() | mb.keys()), key=lambda r: abs(r[0]), reverse=True)
+    print(f"\n{'Δ KB':>12}  asignación (top de cada corrida)")
+    for delta, w in mem[:top]:
+        print(f"{delta:+12.1f}  {w}")
+
+
+def list_runs() -> list[str]:
+    resp = s3.list_objects_v2(Bucket=app.BUCKET, Prefix=app.PROFILE_PREFIX + "/", Delimiter="/")
+    return sorted(p["Prefix"].split("/")[-2] for p in resp.get("CommonPrefixes", []))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfiles por etapa del pipeline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("runs", help="lista las corridas perfiladas")
+    d = sub.add_parser("diff", help="compara los perfiles de dos corridas")
+    d.add_argument("run_a")
+    d.add_argument("run_b")
+    d.add_argument("--stage", help="solo esta etapa")
+    d.add_argument("--top", type=int, default=PROFILE_TOP_N)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "runs":
+        print("\n".join(list_runs()))
+        return
+
+    a, b = load_run(args.run_a), load_run(args.run_b)
+    etapas = [args.stage] if args.stage else [s for s in a if s in b]
+    if not etapas:
+        sys.exit("Las corridas no comparten etapas perfiladas")
+    for stage in etapas:
+        diff_stage(a[stage], b[stage], stage, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+# query.py
+# ----------------------------------------
+# Capa de consultas sobre las salidas mensuales del pipeline (sentimiento y
+# tópicos) en Parquet, con DuckDB embebido leyendo directo de S3:
+#   - poda de particiones: solo se abren los meses YYYY_MM que tocan el rango
+#   - proyección: cada consulta nombra solo las columnas que usa
+#   - predicados: fecha, versión, estrellas, sentimiento y tópico van al WHERE
+#     y DuckDB los empuja al lector Parquet (salta row groups por min/max)
+# Así el costo de una pregunta depende de los meses y columnas que toca y no
+# de todo el histórico.
+#
+#   python query.py convert                          # CSV ya existentes → Parquet (tópicos)
+#   python query.py convert --dataset sentiment 2025_05
+#   python query.py daily 2025-05-01 2025-05-31      # sentimiento por día
+#   python query.py topics 2025-05-01 2025-05-31     # tópicos por versión
+#   python query.py lookup REVIEW_ID [REVIEW_ID ...]
+# ----------------------------------------
+
+import os
+import re
+import hashlib
+import argparse
+import threading
+
+import duckdb
+import pandas as pd
+
+from config import QUERY_THREADS, QUERY_MEMORY_LIMIT
+from apps import app
+from labels import clean_label, EXCLUDED_LABELS
+
+# dataset -> (prefijo en la config de la app, nombre del CSV mensual); el cubo
+# de conteos (cube.build_topic_cube) no tiene CSV: sale del de tópicos
+DATASETS = {
+    "topics":    ("TOPICS_PREFIX", "topics_{ym}.csv"),
+    "sentiment": ("SENTIMENT_PREFIX", "reviews_sentiment_{ym}.csv"),
+    "cube":      ("CUBE_PREFIX", None),
+}
+MONTH_RE = re.compile(r"\d{4}_\d{2}")
+
+REVIEW_COLUMNS = [
+    "reviewId", "review_date", "review_time", "sentiment_pred",
+    "topic_label", "content", "score", "appVersion",
+]
+
+def version_key(col: str = "appVersion") -> str:
+    # versión como lista de componentes numéricos: "11.2" < "11.10" (como texto sería al revés)
+    return (f"list_transform(string_split(CAST({col} AS VARCHAR), '.'), "
+            f"x -> TRY_CAST(regexp_extract(x, '^[0-9]+') AS BIGINT))")
+
+
+# orden de las reseñas; reviewId desempata para que la paginación sea estable
+ORDERS = {
+    "recent":     "review_date DESC NULLS LAST, review_time DESC NULLS LAST, reviewId",
+    "score_asc":  "score ASC NULLS LAST, review_date DESC NULLS LAST, review_time DESC NULLS LAST, reviewId",
+    "score_desc": "score DESC NULLS LAST, review_date DESC NULLS LAST, review_time DESC NULLS LAST, reviewId",
+    "version":    f"{version_key()} ASC NULLS LAST, appVersion, review_date DESC NULLS LAST, review_time DESC NULLS LAST, reviewId",
+}
+
+
+def _sql_str(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def month_of(fecha) -> str:
+    fecha = pd.Timestamp(fecha)
+    return f"{fecha.year:04d}_{fecha.month:02d}"
+
+
+def connect(credentials: dict | None = None, s3: bool = True) -> duckdb.DuckDBPyConnection:
+    """
+    Conexión DuckDB en memoria. Para S3 usa las credenciales dadas
+    (key_id, secret, region) o la cadena por defecto de AWS (rol de Lambda, ~/.aws).
+    """
+    con = duckdb.connect()
+    con.execute(f"SET threads = {int(QUERY_THREADS)}")
+    con.execute(f"SET memory_limit = {_sql_str(QUERY_MEMORY_LIMIT)}")
+    if s3 and credentials:
+        con.execute(
+            "CREATE SECRET pipeline_s3 (TYPE s3, "
+            f"KEY_ID {_sql_str(credentials['key_id'])}, SECRET {_sql_str(credentials['secret'])}, "
+            f"REGION {_sql_str(credentials.get('region', 'us-east-1'))})"
+        )
+    elif s3:
+        con.execute("CREATE SECRET pipeline_s3 (TYPE s3, PROVIDER credential_chain)")
+    return con
+
+
+def where(start=None, end=None, versions=None, min_stars: int = 0, keyword: str = "",
+          sentiment: str | None = None, topics=None) -> tuple[str, list]:
+    """
+    Filtros comunes del dashboard y los reportes como cláusula WHERE parametrizada.
+    Fechas inclusivas; `keyword` es una expresión regular sin distinguir mayúsculas
+    (como str.contains); `sentiment` es "POS" o "NEG".
+    """
+    conds, params = [], []
+    if start is not None:
+        conds.append("review_date >= ?")
+        params.append(str(start))
+    if end is not None:
+        conds.append("review_date <= ?")
+        params.append(str(end))
+    if versions:
+        conds.append(f"appVersion IN ({', '.join('?' * len(versions))})")
+        params += [str(v) for v in versions]
+    if min_stars:
+        conds.append("score >= ?")
+        params.append(int(min_stars))
+    if keyword:
+        conds.append("regexp_matches(content, ?, 'i')")
+        params.append(keyword)
+    if sentiment:
+        conds.append("upper(sentiment_pred) = ?")
+        params.append(sentiment.upper())
+    if topics:
+        conds.append(f"topic_label IN ({', '.join('?' * len(topics))})")
+        params += list(topics)
+    return (" WHERE " + " AND ".join(conds)) if conds else "", params
+
+
+def _columns(columns) -> str:
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def _read(urls: list[str]) -> str:
+    return f"read_parquet([{', '.join(map(_sql_str, urls))}], union_by_name = true)"
+
+
+def _dates(df: pd.DataFrame, col: str = "review_date") -> pd.DataFrame:
+    if col in df.columns:
+        df[col] = pd.to_datetime(df[col], format="%Y-%m-%d", errors="coerce").dt.date
+    return df
+
+
+# ---------------------------------------------------------
+# 1) DATASET MENSUAL CONSULTABLE
+# ---------------------------------------------------------
+class ReviewStore:
+    """
+    Salidas mensuales de una etapa ({root}/YYYY_MM/*.parquet) consultables con SQL.
+    El listado de meses se hace una vez (refresh() lo renueva); cada consulta
+    abre solo los archivos de los meses que pide su rango de fechas.
+    """
+
+    def __init__(self, dataset: str = "topics", root: str | None = None,
+                 credentials: dict | None = None, s3_client=None):
+        if dataset not in DATASETS:
+            raise ValueError(f"Dataset desconocido: '{dataset}' (opciones: {', '.join(DATASETS)})")
+        prefix = getattr(app, DATASETS[dataset][0])
+        self.dataset = dataset
+        self.root    = (root or f"s3://{app.BUCKET}/{prefix}").rstrip("/")
+        self.con     = connect(credentials, s3=self.root.startswith("s3://"))
+        self._lock   = threading.Lock()
+        self._files  = None
+        self.token   = None
+        self._s3     = s3_client
+        self._creds  = credentials
+
+    def _cursor(self):
+        # una conexión DuckDB no se comparte entre hilos: cada consulta usa su cursor
+        return self.con.cursor()
+
+    def refresh(self) -> dict:
+        """
+        Lista {root}/YYYY_MM/*.parquet (las carpetas _parts y _profiles quedan fuera).
+        """
+        with self._lock:
+            rows = self._cursor().execute("SELECT file FROM glob(?)", [f"{self.root}/*/*.parquet"]).fetchall()
+            files = {}
+            for (url,) in rows:
+                mes = url.rstrip("/").split("/")[-2]
+                if MONTH_RE.fullmatch(mes):
+                    files.setdefault(mes, []).append(url)
+            self._files = dict(sorted(files.items()))
+            self.token  = self._fingerprint([url for lista in self._files.values() for url in lista])
+            return self._files
+
+    def _s3_client(self):
+        """
+        Cliente boto3 para listar ETags: el recibido, uno con las mismas credenciales
+        que DuckDB o, sin ninguno, storage.s3 (cadena por defecto de AWS).
+        """
+        if self._s3 is None and self._creds:
+            import boto3
+            self._s3 = boto3.client(
+                "s3", aws_access_key_id=self._creds["key_id"],
+                aws_secret_access_key=self._creds["secret"], region_name=self._creds.get("region"),
+            )
+        if self._s3 is None:
+            from storage import s3
+            self._s3 = s3
+        return self._s3
+
+    def _fingerprint(self, urls: list[str]) -> str:
+        """
+        Versión de los datos listados: ETag de cada archivo en S3 (tamaño y mtime
+        en disco). Solo cambia si se reescribe algún mes, así las vistas
+        memorizadas del dashboard sobreviven a un refresh sin cambios.
+        """
+        h = hashlib.md5()
+        if self.root.startswith("s3://"):
+            cliente = self._s3_client()
+            bucket, _, prefix = self.root[len("s3://"):].partition("/")
+            etags = {}
+            for page in cliente.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix + "/"):
+                for obj in page.get("Contents", []):
+                    etags[f"s3://{bucket}/{obj['Key']}"] = obj["ETag"]
+            for url in sorted(urls):
+                h.update(f"{url}={etags.get(url)}\n".encode())
+        else:
+            for url in sorted(urls):
+                st = os.stat(url)
+                h.update(f"{url}={st.st_size}:{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+
+    def months(self) -> list[str]:
+        return list(self._files if self._files is not None else self.refresh())
+
+    def source(self, start=None, end=None) -> str | None:
+        """
+        read_parquet(...) solo con los meses que se cruzan con [start, end].
+        """
+        self.months()
+        desde = month_of(start) if start is not None else None
+        hasta = month_of(end) if end is not None else None
+        urls = [
+            url for mes, lista in self._files.items()
+            if (desde is None or mes >= desde) and (hasta is None or mes <= hasta)
+            for url in lista
+        ]
+        return _read(urls) if urls else None
+
+    def sql(self, select: str, tail: str = "", params=None, extra: tuple[str, list] | None = None,
+            start=None, end=None, columns: list[str] | None = None, **filtros) -> pd.DataFrame:
+        """
+        SELECT {select} FROM <meses podados> WHERE <filtros> [AND extra] {tail}.
+        Sin meses en el rango devuelve un DataFrame vacío con `columns`.
+        """
+        src = self.source(start, end)
+        if src is None:
+            return pd.DataFrame(columns=columns or [])
+        cond, args = where(start=start, end=end, **filtros)
+        if extra:
+            cond = f"{cond} AND {extra[0]}" if cond else f" WHERE {extra[0]}"
+            args += list(extra[1])
+        query = f"SELECT {select} FROM {src}{cond} {tail}"
+        return self._cursor().execute(query, args + list(params or [])).df()
+
+    # ---------------------------------------------------------
+    # 2) AGREGADOS COMUNES
+    # ---------------------------------------------------------
+    def date_bounds(self, **filtros) -> tuple:
+        """
+        (fecha mínima, fecha máxima) de las reseñas que pasan los filtros.
+        """
+        df = self.sql("min(review_date) AS desde, max(review_date) AS hasta",
+                      columns=["desde", "hasta"], **filtros)
+        df = _dates(_dates(df, "desde"), "hasta")
+        if df.empty or pd.isna(df.loc[0, "desde"]):
+            return None, None
+        return df.loc[0, "desde"], df.loc[0, "hasta"]
+
+    def versions(self, **filtros) -> list[str]:
+        df = self.sql("DISTINCT appVersion AS version",
+                      f"ORDER BY {version_key('version')} NULLS LAST, version",
+                      columns=["version"], **filtros)
+        return df["version"].dropna().tolist()
+
+    def summary(self, **filtros) -> dict:
+        """
+        Total de reseñas, POS, NEG y calificación promedio.
+        """
+        df = self.sql(
+            "count(*) AS total, "
+            "count(*) FILTER (WHERE upper(sentiment_pred) = 'POS') AS pos, "
+            "count(*) FILTER (WHERE upper(sentiment_pred) = 'NEG') AS neg, "
+            "avg(score) AS avg_score",
+            columns=["total", "pos", "neg", "avg_score"], **filtros,
+        )
+        if df.empty:
+            return {"total": 0, "pos": 0, "neg": 0, "avg_score": None}
+        fila = df.iloc[0]
+        return {
+            "total": int(fila["total"]), "pos": int(fila["pos"]), "neg": int(fila["neg"]),
+            "avg_score": None if pd.isna(fila["avg_score"]) else float(fila["avg_score"]),
+        }
+
+    def sentiment_by_day(self, **filtros) -> pd.DataFrame:
+        """
+        Por día: reseñas POS, NEG, total y calificación promedio.
+        """
+        df = self.sql(
+            "review_date, "
+            "count(*) FILTER (WHERE upper(sentiment_pred) = 'POS') AS pos, "
+            "count(*) FILTER (WHERE upper(sentiment_pred) = 'NEG') AS neg, "
+            "count(*) AS reviews, avg(score) AS avg_score",
+            "GROUP BY review_date ORDER BY review_date",
+            columns=["review_date", "pos", "neg", "reviews", "avg_score"], **filtros,
+        )
+        return _dates(df)
+
+    def topics_by_version(self, **filtros) -> pd.DataFrame:
+        """
+        Conteo por (tópico, sentimiento, versión) sin outliers ni comentarios
+        cortos, con `topic_name` legible; es la entrada de cube.topic_tables.
+        Sobre el dataset "cube" suma los conteos ya agregados (sin `keyword`,
+        que necesita el texto de cada reseña).
+        """
+        excluidos = sorted(EXCLUDED_LABELS)
+        conteo = "sum(conteo)" if self.dataset == "cube" else "count(*)"
+        df = self.sql(
+            f"topic_id, topic_label, sentiment_pred, appVersion, CAST({conteo} AS BIGINT) AS conteo",
+            "GROUP BY ALL ORDER BY conteo DESC",
+            extra=(f"topic_label NOT IN ({', '.join('?' * len(excluidos))})", excluidos),
+            columns=["topic_id", "topic_label", "sentiment_pred", "appVersion", "conteo"], **filtros,
+        )
+        nombres = {t: clean_label(t) for t in df["topic_label"].unique()}
+        df["topic_name"] = df["topic_label"].map(nombres)
+        return df
+
+    def topic_labels(self, **filtros) -> list[str]:
+        df = self.sql("DISTINCT topic_label", "ORDER BY topic_label", columns=["topic_label"], **filtros)
+        return df["topic_label"].dropna().tolist()
+
+    # ---------------------------------------------------------
+    # 3) RESEÑAS INDIVIDUALES
+    # ---------------------------------------------------------
+    def count_reviews(self, **filtros) -> int:
+        df = self.sql("count(*) AS n", columns=["n"], **filtros)
+        return int(df.loc[0, "n"]) if not df.empty else 0
+
+    def reviews(self, order: str = "recent", limit: int = 50, offset: int = 0,
+                columns: list[str] | None = None, **filtros) -> pd.DataFrame:
+        """
+        Una página de reseñas ordenada según ORDERS (DuckDB resuelve ORDER BY +
+        LIMIT como top-N sin ordenar todo el conjunto).
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Orden desconocido: '{order}' (opciones: {', '.join(ORDERS)})")
+        columns = columns or REVIEW_COLUMNS
+        df = self.sql(
+            _columns(columns),
+            f"ORDER BY {ORDERS[order]} LIMIT ? OFFSET ?",
+            params=[int(limit), int(offset)], columns=columns, **filtros,
+        )
+        return _dates(df)
+
+    def lookup(self, review_ids, months: list[str] | None = None,
+               columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        Reseñas por reviewId. Con `months` solo se abren esos meses.
+        """
+        columns = columns or REVIEW_COLUMNS
+        ids = [str(r) for r in review_ids]
+        self.months()
+        urls = [u for mes, lista in self._files.items() if not months or mes in months for u in lista]
+        if not ids or not urls:
+            return pd.DataFrame(columns=columns)
+        query = (f"SELECT {_columns(columns)} FROM {_read(urls)} "
+                 f"WHERE reviewId IN ({', '.join('?' * len(ids))})")
+        return _dates(self._cursor().execute(query, ids).df())
+
+
+# ---------------------------------------------------------
+# 4) CONVERSIÓN DE LOS CSV YA EXISTENTES
+# ---------------------------------------------------------
+def convert_months(dataset: str = "topics", months: list[str] | None = None) -> list[str]:
+    """
+    Sube la copia Parquet de los CSV mensuales escritos antes de QUERY_PARQUET;
+    para tópicos también el cubo de conteos del mes.
+    """
+    import io
+    from storage import s3, list_months, write_parquet, CSV_DTYPES
+    from cube import build_topic_cube
+
+    prefix = getattr(app, DATASETS[dataset][0])
+    keys = []
+    for ym in months or list_months(prefix):
+        csv_key = f"{prefix}/{ym}/{DATASETS[dataset][1].format(ym=ym)}"
+        try:
+            obj = s3.get_object(Bucket=app.BUCKET, Key=csv_key)
+        except s3.exceptions.NoSuchKey:
+            print(f"   ⚠️  {ym}: no existe {csv_key}, se omite.")
+            continue
+        df = pd.read_csv(io.BytesIO(obj["Body"].read()), on_bad_lines="skip", dtype=CSV_DTYPES)
+        keys.append(write_parquet(df, csv_key))
+        print(f"✓ {ym}: {len(df):,} filas → s3://{app.BUCKET}/{keys[-1]}")
+        if dataset == "topics":
+            keys.append(write_parquet(build_topic_cube(df), f"{app.CUBE_PREFIX}/{ym}/cube_{ym}.parquet"))
+            print(f"✓ {ym}: cubo → s3://{app.BUCKET}/{keys[-1]}")
+    return keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre las salidas del pipeline (DuckDB + Parquet)")
+    parser.add_argument("--dataset", choices=list(DATASETS), default="topics")
+    parser.add_argument("--root", help="s3://bucket/prefijo o carpeta local (por defecto el de la app)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="sube la copia Parquet de los CSV mensuales existentes (y el cubo con topics)")
+    c.add_argument("months", nargs="*")
+    for nombre in ("daily", "topics"):
+        p = sub.add_parser(nombre, help="sentimiento por día" if nombre == "daily" else "tópicos por versión")
+        p.add_argument("start")
+        p.add_argument("end")
+    lk = sub.add_parser("lookup", help="reseñas por reviewId")
+    lk.add_argument("review_ids", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "convert":
+        if DATASETS[args.dataset][1] is None:
+            parser.error("el cubo se genera junto con los tópicos: python query.py convert")
+        convert_months(args.dataset, args.months)
+        return
+
+    store = ReviewStore(args.dataset, root=args.root)
+    with pd.option_context("display.max_rows", 500, "display.width", 200):
+        if args.cmd == "daily":
+            print(store.sentiment_by_day(start=args.start, end=args.end).to_string(index=False))
+        elif args.cmd == "topics":
+            print(store.topics_by_version(start=args.start, end=args.end).to_string(index=False))
+        else:
+            print(store.lookup(args.review_ids).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+# runner.py
+# ----------------------------------------
+# Runner local: divide el pipeline en tareas (etapa, mes, partición) con
+# dependencias, las ejecuta en un pool de procesos con reintentos y guarda su
+# estado en una tabla SQLite para reanudar corridas interrumpidas.
+#
+#   python runner.py                                # todos los meses de RAW_PREFIX
+#   python runner.py --months 2025_04 2025_05 --workers 8
+#   python runner.py --stages sentiment topics      # sin extraer ni limpiar
+#   python runner.py --resume                       # continúa la última corrida
+# ----------------------------------------
+
+import json
+import time
+import sqlite3
+import argparse
+import traceback
+import multiprocessing as mp
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from config import (
+    TOPIC_MODE, RUNNER_DB, RUNNER_WORKERS, RUNNER_RETRIES,
+    RUNNER_RETRY_DELAY_S, RUNNER_SENTIMENT_PARTS,
+)
+from apps import app, current_app, find_app, use_app
+from storage import list_months
+from manifest import deferred, apply_deferred
+
+
+# ---------------------------------------------------------
+# 1) TAREAS: (etapa, mes, partición) → función de la etapa
+# ---------------------------------------------------------
+def _extract(month, partition, n_parts):
+    from extract import extract_reviews
+    return extract_reviews()
+
+
+def _clean(month, partition, n_parts):
+    from clean import clean_new_reviews
+    return clean_new_reviews(month)
+
+
+def _sentiment_part(month, partition, n_parts):
+    from sentiment import score_partition
+    return score_partition(month, partition, n_parts)
+
+
+def _sentiment(month, partition, n_parts):
+    from sentiment import apply_sentiment_month
+    return apply_sentiment_month(month, n_parts)
+
+
+def _topics(month, partition, n_parts):
+    import topics
+    if month is None:                    # modo rolling: una sola tarea para la ventana
+        return topics.apply_topics()
+    df = topics.load_sentiment_csv_for_month(month)
+    if len(df) < topics.MIN_REVIEWS:
+        print(f"⚠️ {month}: {len(df)} reseñas (< {topics.MIN_REVIEWS}), no se entrenan tópicos")
+        return None
+    return topics.topics_for_month(month, df)
+
+
+def _priority(month, partition, n_parts):
+    from priority import apply_priority
+    return apply_priority()
+
+
+TASKS = {
+    "extract":        _extract,
+    "clean":          _clean,
+    "sentiment_part": _sentiment_part,
+    "sentiment":      _sentiment,
+    "topics":         _topics,
+    "priority":       _priority,
+}
+
+STAGES = ["extract", "clean", "sentiment", "topics", "priority"]
+
+
+def task_id(stage: str, month: str | None = None, partition: int | None = None) -> str:
+    return ":".join(str(p) for p in (stage, month, partition) if p is not None)
+
+
+def run_task(stage: str, month: str | None = None, partition: int | None = None, n_parts: int = 1):
+    """
+    Ejecuta una sola tarea; la usan los procesos del pool y el handler de Lambda.
+    """
+    if stage not in TASKS:
+        raise ValueError(f"Etapa desconocida: '{stage}' (opciones: {', '.join(TASKS)})")
+    return TASKS[stage](month, partition, n_parts)
+
+
+# ---------------------------------------------------------
+# 2) PLAN DE TAREAS POR MES
+# ---------------------------------------------------------
+def build_plan(months: list[str], stages: list[str], n_parts: int = RUNNER_SENTIMENT_PARTS,
+               topic_mode: str = TOPIC_MODE) -> list[dict]:
+    """
+    Tareas por mes con sus dependencias. Una etapa que no está en `stages`
+    no genera tareas y sus salidas se toman como ya existentes en S3.
+    """
+    plan = []
+
+    def add(stage, month=None, partition=None, deps=()):
+        t = {"id": task_id(stage, month, partition), "stage": stage, "month": month,
+             "partition": partition, "n_parts": n_parts, "deps": [d for d in deps if d]}
+        plan.append(t)
+        return t["id"]
+
+    extract_id = task_id("extract") if "extract" in stages else None
+    sentiment_ids, topic_ids = [], []
+    for mes in months:
+        clean_id = add("clean", mes, deps=[extract_id]) if "clean" in stages else None
+        if "sentiment" in stages:
+            deps = [clean_id]
+            if n_parts > 1:
+                deps = [add("sentiment_part", mes, p, deps=[clean_id]) for p in range(n_parts)]
+            sentiment_ids.append(add("sentiment", mes, deps=deps))
+        if "topics" in stages and topic_mode != "rolling":
+            topic_ids.append(add("topics", mes, deps=[task_id("sentiment", mes) if "sentiment" in stages else None]))
+    if "topics" in stages and topic_mode == "rolling":
+        topic_ids.append(add("topics", deps=sentiment_ids))
+    if "priority" in stages:
+        add("priority", deps=topic_ids)
+    return plan
+
+
+# ---------------------------------------------------------
+# 3) TABLA DE TRABAJOS (SQLite)
+# ---------------------------------------------------------
+# status: pending → running → done | failed; "blocked" si una dependencia falló
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    params     TEXT NOT NULL,
+    finished   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id      INTEGER NOT NULL,
+    task_id     TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    month       TEXT,
+    partition   INTEGER,
+    n_parts     INTEGER NOT NULL,
+    deps        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    not_before  REAL NOT NULL DEFAULT 0,
+    output      TEXT,
+    error       TEXT,
+    started_at  TEXT,
+    finished_at TEXT,
+    PRIMARY KEY (run_id, task_id)
+);
+"""
+
+
+def open_db(path: str = RUNNER_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def new_run(conn: sqlite3.Connection, params: dict) -> int:
+    cur = conn.execute("INSERT INTO runs (created_at, params) VALUES (?, ?)", (_now(), json.dumps(params)))
+    conn.commit()
+    return cur.lastrowid
+
+
+def resume_run(conn: sqlite3.Connection) -> tuple[int, dict] | None:
+    """
+    Última corrida sin terminar: las tareas que quedaron en curso, fallidas o
+    bloqueadas vuelven a pending (las terminadas no se repiten).
+    """
+    row = conn.execute("SELECT run_id, params FROM runs WHERE finished = 0 ORDER BY run_id DESC LIMIT 1").fetchone()
+    if row is None:
+        return None
+    conn.execute(
+        "UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0 "
+        "WHERE run_id = ? AND status IN ('running', 'failed', 'blocked')",
+        (row["run_id"],),
+    )
+    conn.commit()
+    return row["run_id"], json.loads(row["params"])
+
+
+def insert_tasks(conn: sqlite3.Connection, run_id: int, plan: list[dict]) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO jobs (run_id, task_id, stage, month, partition, n_parts, deps) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(run_id, t["id"], t["stage"], t["month"], t["partition"], t["n_parts"], json.dumps(t["deps"]))
+         for t in plan],
+    )
+    conn.commit()
+
+
+def _update(conn: sqlite3.Connection, run_id: int, tid: str, **campos) -> None:
+    sets = ", ".join(f"{k} = ?" for k in campos)
+    conn.execute(f"UPDATE jobs SET {sets} WHERE run_id = ? AND task_id = ?", (*campos.values(), run_id, tid))
+    conn.commit()
+
+
+def run_summary(conn: sqlite3.Connection, run_id: int) -> dict:
+    rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs WHERE run_id = ? GROUP BY status", (run_id,))
+    return {r["status"]: r["n"] for r in rows}
+
+
+# ---------------------------------------------------------
+# 4) EJECUCIÓN CON REINTENTOS
+# ---------------------------------------------------------
+def _call(stage, month, partition, n_parts, app_name=None):
+    # en el proceso hijo: devuelve (ok, salida | traceback, manifiestos) para no
+    # perder el error; la app activa no cruza el spawn, así que se restaura por
+    # nombre. Las entradas de manifiesto vuelven al padre, que es el único que escribe.
+    try:
+        with use_app(find_app(app_name)), deferred() as entradas:
+            return True, run_task(stage, month, partition, n_parts), entradas
+    except Exception:
+        return False, traceback.format_exc(), []
+
+
+def drain(conn: sqlite3.Connection, run_id: int, workers: int, retries: int = RUNNER_RETRIES,
+          app_name: str | None = None) -> None:
+    """
+    Ejecuta las tareas pendientes de la corrida hasta que no quede ninguna lista.
+    Una tarea que agota sus reintentos queda en failed y sus dependientes en
+    blocked; el resto de los meses sigue corriendo.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) if workers > 1 else None
+    en_curso = {}   # future -> task_id
+
+    def terminar(tid, ok, salida, manifiestos=()):
+        job = conn.execute("SELECT attempts FROM jobs WHERE run_id = ? AND task_id = ?", (run_id, tid)).fetchone()
+        if ok:
+            apply_deferred(manifiestos)
+            _update(conn, run_id, tid, status="done", output=json.dumps(salida, default=str),
+                    error=None, finished_at=_now())
+            print(f"   ✓ {tid}")
+        elif job["attempts"] <= retries:
+            espera = RUNNER_RETRY_DELAY_S * 2 ** (job["attempts"] - 1)
+            _update(conn, run_id, tid, status="pending", error=salida, not_before=time.time() + espera)
+            print(f"   ↻ {tid} falló (intento {job['attempts']}), reintento en {espera}s")
+        else:
+            _update(conn, run_id, tid, status="failed", error=salida, finished_at=_now())
+            print(f"   ❌ {tid} falló tras {job['attempts']} intentos:\n{salida}")
+
+    try:
+        while True:
+            jobs   = {r["task_id"]: r for r in conn.execute("SELECT * FROM jobs WHERE run_id = ?", (run_id,))}
+            status = {tid: r["status"] for tid, r in jobs.items()}
+
+            # dependientes de tareas fallidas no se ejecutan en esta corrida
+            for tid, r in jobs.items():
+                if r["status"] == "pending" and any(status.get(d) in ("failed", "blocked") for d in json.loads(r["deps"])):
+                    _update(conn, run_id, tid, status="blocked")
+                    status[tid] = "blocked"
+
+            ahora  = time.time()
+            listas = [
+                r for tid, r in jobs.items()
+                if status[tid] == "pending" and r["not_before"] <= ahora
+                and all(status.get(d, "done") == "done" for d in json.loads(r["deps"]))
+            ]
+            for r in listas[:max(0, workers - len(en_curso))]:
+                _update(conn, run_id, r["task_id"], status="running", attempts=r["attempts"] + 1, started_at=_now())
+                args = (r["stage"], r["month"], r["partition"], r["n_parts"], app_name)
+                if pool is None:   # modo en proceso (Lambda o --workers 1)
+                    terminar(r["task_id"], *_call(*args))
+                else:
+                    en_curso[pool.submit(_call, *args)] = r["task_id"]
+
+            if en_curso:
+                hechos, _ = wait(en_curso, timeout=1, return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    tid = en_curso.pop(fut)
+                    try:
+                        terminar(tid, *fut.result())
+                    except Exception:   # el proceso murió (OOM, señal): cuenta como intento fallido
+                        terminar(tid, False, traceback.format_exc())
+            elif listas:
+                continue
+            elif any(s == "pending" for s in status.values()):
+                time.sleep(1)       # solo quedan reintentos en espera
+            else:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def run(months: list[str] | None = None, stages: list[str] | None = None,
+        workers: int | None = RUNNER_WORKERS, resume: bool = False,
+        n_parts: int = RUNNER_SENTIMENT_PARTS, db_path: str = RUNNER_DB) -> dict:
+    """
+    Corre (o reanuda) el pipeline por mes en paralelo. Extract va primero porque
+    define los meses disponibles; después se planifican las tareas por mes.
+    """
+    conn = open_db(db_path)
+    workers = workers or mp.cpu_count()
+
+    reanudada = resume_run(conn) if resume else None
+    if reanudada:
+        run_id, params = reanudada
+        print(f"🔁 Reanudando corrida {run_id}")
+    else:
+        params = {"months": months, "stages": stages or STAGES, "n_parts": n_parts,
+                  "app": current_app()["name"]}
+        run_id = new_run(conn, params)
+        print(f"🟡 Corrida {run_id} ({params['app']}): etapas {', '.join(params['stages'])}, {workers} procesos")
+
+    stages   = params["stages"]
+    app_name = params.get("app")
+    with use_app(find_app(app_name)):
+        if "extract" in stages:
+            insert_tasks(conn, run_id, [{"id": task_id("extract"), "stage": "extract", "month": None,
+                                         "partition": None, "n_parts": 1, "deps": []}])
+            drain(conn, run_id, workers=1, app_name=app_name)
+
+        meses = params["months"] or list_months(app.RAW_PREFIX)
+        insert_tasks(conn, run_id, build_plan(meses, stages, params["n_parts"]))
+        drain(conn, run_id, workers, app_name=app_name)
+
+    resumen = run_summary(conn, run_id)
+    if set(resumen) <= {"done"}:
+        conn.execute("UPDATE runs SET finished = 1 WHERE run_id = ?", (run_id,))
+        conn.commit()
+    print(f"{'✅' if set(resumen) <= {'done'} else '⚠️'} Corrida {run_id}: {resumen}")
+    conn.close()
+    return {"run_id": run_id, "jobs": resumen}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runner local del pipeline por (etapa, mes, partición)")
+    parser.add_argument("--months", nargs="*", help="meses YYYY_MM (por defecto todos los de RAW_PREFIX)")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, help="etapas a ejecutar (por defecto todas)")
+    parser.add_argument("--workers", type=int, default=RUNNER_WORKERS)
+    parser.add_argument("--parts", type=int, default=RUNNER_SENTIMENT_PARTS, help="particiones de sentimiento por mes")
+    parser.add_argument("--resume", action="store_true", help="reanuda la última corrida sin terminar")
+    parser.add_argument("--db", default=RUNNER_DB)
+    args = parser.parse_args()
+    run(args.months, args.stages, args.workers, args.resume, args.parts, args.db)
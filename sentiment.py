@@ -1,57 +1,355 @@
 # sentiment.py
 
 import io
-import boto3
+import os
+import zlib
+import atexit
+import argparse
+import threading
+import multiprocessing as mp
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 import joblib
 
-from config import BUCKET, CLEAN_PREFIX, MODEL_KEY_V2, SENTIMENT_PREFIX
+from config import (
+    MODEL_BUCKET, MODEL_KEY_V2,
+    SENTIMENT_CACHE_SIZE, SENTIMENT_BATCH_SIZE, SENTIMENT_WORKERS, SENTIMENT_CHUNK_SIZE,
+)
+from apps import app
+from storage import s3, write_parquet, CSV_DTYPES
+from textprep import dedupe_texts, clean_text
+from manifest import record_month
 # Asegúrate de añadir en config.py:
 # SENTIMENT_PREFIX = "sentimientos"
 
+
+# ---------------------------------------------------------
+# 1) MODELO Y CACHÉ DE PUNTAJES
+# ---------------------------------------------------------
+_pipes = {}             # model_key -> pipeline cargado
+_lock  = threading.Lock()
+
+
+def _model_path(model_key: str) -> str:
+    return "/tmp/" + model_key.replace("/", "_")
+
+
+def load_pipeline(model_key: str = MODEL_KEY_V2):
+    """
+    Descarga y carga el pipeline de sentimiento una sola vez por proceso.
+    """
+    with _lock:
+        if model_key not in _pipes:
+            tmp_model = _model_path(model_key)
+            s3.download_file(MODEL_BUCKET, model_key, tmp_model)
+            _pipes[model_key] = joblib.load(tmp_model)
+            print(f"🔍 Modelo {model_key} cargado desde S3")
+        return _pipes[model_key]
+
+
+class ScoreCache:
+    """
+    LRU acotado por número de textos: texto normalizado -> (sentiment_pred, prob_pos).
+    """
+
+    def __init__(self, maxsize: int = SENTIMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data   = OrderedDict()
+        self._lock   = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+_caches = {}            # model_key -> ScoreCache
+
+
+def normalize_text(text) -> str:
+    """
+    Llave de caché y entrada del modelo: la misma limpieza de clean.py con la que
+    se entrenó (textprep.clean_text). Es idempotente sobre content_clean, así que
+    la etapa mensual no cambia, y un texto crudo ("¡Muy  buena App!") se puntúa
+    igual que su versión limpia.
+    """
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ""
+    return clean_text(text)
+
+
+# ---------------------------------------------------------
+# 2) INFERENCIA POR BLOQUES EN PARALELO
+# ---------------------------------------------------------
+# El pool usa spawn: con fork los hijos copiarían locks tomados por otros hilos
+# (varias apps en run_apps, el cliente S3) y podrían quedar bloqueados. El
+# padre descarga el modelo una vez y cada proceso lo carga del archivo local
+# en su inicializador. Se reutiliza entre meses (backfill) mientras no cambie
+# el número de procesos.
+_pools = {}             # model_key -> (Pool, workers)
+_pools_lock = threading.Lock()
+
+
+def _predict(pipe, texts: list[str], batch_size: int):
+    preds = np.empty(len(texts), dtype=object)
+    probs = np.empty(len(texts), dtype=float)
+    for j in range(0, len(texts), batch_size):
+        proba = pipe.predict_proba(texts[j:j + batch_size])
+        preds[j:j + batch_size] = pipe.classes_[proba.argmax(axis=1)]
+        probs[j:j + batch_size] = proba[:, 1]
+    return preds, probs
+
+
+def _init_worker(model_key: str, tmp_model: str) -> None:
+    # corre una vez por proceso hijo: carga el modelo ya descargado por el padre
+    _pipes[model_key] = joblib.load(tmp_model)
+
+
+def _predict_chunk(args):
+    # corre en el proceso hijo: el modelo lo cargó _init_worker
+    model_key, texts, batch_size = args
+    return _predict(_pipes[model_key], texts, batch_size)
+
+
+def get_pool(model_key: str, workers: int):
+    """
+    Pool de inferencia (spawn) para `model_key`; descarga el modelo antes de crearlo.
+    """
+    with _pools_lock:   # varias apps (hilos) pueden pedir el pool a la vez
+        pool, n = _pools.get(model_key, (None, 0))
+        if pool is not None and n == workers:
+            return pool
+        if pool is not None:
+            pool.close()
+            pool.join()
+        load_pipeline(model_key)
+        pool = mp.get_context("spawn").Pool(
+            workers, initializer=_init_worker, initargs=(model_key, _model_path(model_key)),
+        )
+        _pools[model_key] = (pool, workers)
+        return pool
+
+
+@atexit.register
+def close_pools() -> None:
+    for pool, _ in _pools.values():
+        pool.close()
+        pool.join()
+    _pools.clear()
+
+
+def score_texts(texts, model_key: str = MODEL_KEY_V2,
+                batch_size: int = SENTIMENT_BATCH_SIZE,
+                workers: int | None = SENTIMENT_WORKERS,
+                chunk_size: int = SENTIMENT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Puntúa textos con el pipeline de sentimiento.
+    - Acepta texto crudo o content_clean: cada fila pasa por clean_text y se
+      colapsa a textos únicos (índice inverso).
+    - Cada texto único se busca primero en el LRU del modelo.
+    - Los no memorizados se envían al modelo en micro-lotes de `batch_size`
+      (una sola llamada a predict_proba por lote).
+    - Con `workers` > 1 y más de `chunk_size` textos pendientes, los bloques
+      se reparten en un pool de procesos y se reensamblan en orden.
+    Devuelve un DataFrame alineado con `texts` con columnas sentiment_pred y prob_pos.
+    """
+    index = texts.index if isinstance(texts, pd.Series) else None
+    inverse, uniques = dedupe_texts(texts, normalize=normalize_text)
+
+    cache = _caches.setdefault(model_key, ScoreCache())
+    preds = np.empty(len(uniques), dtype=object)
+    probs = np.empty(len(uniques), dtype=float)
+    pendientes = []
+    for i, k in enumerate(uniques):
+        hit = cache.get(k)
+        if hit is None:
+            pendientes.append(i)
+        else:
+            preds[i], probs[i] = hit
+
+    if pendientes:
+        textos  = [uniques[i] for i in pendientes]
+        workers = workers or os.cpu_count()
+        if workers > 1 and len(textos) > chunk_size:
+            pool    = get_pool(model_key, workers)
+            bloques = [(model_key, textos[j:j + chunk_size], batch_size)
+                       for j in range(0, len(textos), chunk_size)]
+            partes  = pool.map(_predict_chunk, bloques)   # map conserva el orden de los bloques
+            preds[pendientes] = np.concatenate([p for p, _ in partes])
+            probs[pendientes] = np.concatenate([q for _, q in partes])
+        else:
+            preds[pendientes], probs[pendientes] = _predict(load_pipeline(model_key), textos, batch_size)
+        for i in pendientes:
+            cache.put(uniques[i], (preds[i], float(probs[i])))
+
+    return pd.DataFrame(
+        {"sentiment_pred": preds[inverse], "prob_pos": probs[inverse]},
+        index=index,
+    )
+
+
+# ---------------------------------------------------------
+# 3) ETAPA MENSUAL
+# ---------------------------------------------------------
+def clean_key(ym: str) -> str:
+    return f"{app.CLEAN_PREFIX}/{ym}/clean_reviews_{ym}.csv"
+
+
+def part_key(ym: str, part: int, n_parts: int) -> str:
+    return f"{app.SENTIMENT_PREFIX}/{ym}/_parts/texts_{part:03d}_of_{n_parts:03d}.csv"
+
+
+def partition_of(text_key: str, n_parts: int) -> int:
+    # crc32 y no hash(): debe dar lo mismo en todos los procesos del runner
+    return zlib.crc32(text_key.encode("utf-8")) % n_parts
+
+
+def read_clean_month(ym: str) -> pd.DataFrame:
+    obj = s3.get_object(Bucket=app.BUCKET, Key=clean_key(ym))
+    return pd.read_csv(io.BytesIO(obj["Body"].read()), parse_dates=["at"], dtype=CSV_DTYPES)
+
+
+def score_partition(ym: str, part: int, n_parts: int) -> str:
+    """
+    Puntúa los textos únicos (normalizados) del CSV limpio de `ym` que caen en
+    la partición `part` de `n_parts` por hash del texto: cada texto se puntúa en
+    una sola partición y los repetidos no se reparten entre procesos. Guarda
+    text → sentiment_pred/prob_pos.
+    """
+    obj   = s3.get_object(Bucket=app.BUCKET, Key=clean_key(ym))
+    col   = pd.read_csv(io.BytesIO(obj["Body"].read()), usecols=["content_clean"])["content_clean"]
+    texts = [k for k in pd.unique(col.map(normalize_text)) if partition_of(k, n_parts) == part]
+    scores = score_texts(pd.Series(texts, dtype=object), MODEL_KEY_V2)
+    scores.insert(0, "text", texts)
+
+    key = part_key(ym, part, n_parts)
+    buf = io.StringIO()
+    scores.to_csv(buf, index=False, encoding="utf-8")
+    s3.put_object(Bucket=app.BUCKET, Key=key, Body=buf.getvalue())
+    print(f"   • {ym} parte {part + 1}/{n_parts}: {len(texts):,} textos únicos puntuados")
+    return key
+
+
+def apply_sentiment_month(ym: str, n_parts: int = 1, workers: int | None = SENTIMENT_WORKERS) -> list[str]:
+    """
+    Escribe reviews_sentiment_{ym}.csv (y su Parquet con QUERY_PARQUET). Con
+    n_parts > 1 ensambla por texto los puntajes ya calculados por score_partition
+    (y borra las partes); si no, puntúa el mes completo. Devuelve las llaves escritas.
+    """
+    df = read_clean_month(ym)
+    print(f"✅ Reseñas limpias cargadas ({ym}): {len(df):,} filas")
+
+    if n_parts > 1:
+        keys  = [part_key(ym, p, n_parts) for p in range(n_parts)]
+        # keep_default_na=False: el texto vacío es una llave válida, no NaN
+        parts = [pd.read_csv(io.BytesIO(s3.get_object(Bucket=app.BUCKET, Key=k)["Body"].read()),
+                             keep_default_na=False) for k in keys]
+        scores = pd.concat(parts, ignore_index=True).set_index("text")
+        claves = df["content_clean"].map(normalize_text)
+        faltan = ~claves.isin(scores.index)
+        if faltan.any():
+            raise RuntimeError(f"Partes de {ym} incompletas: {int(faltan.sum()):,} de {len(df):,} filas sin puntaje")
+        df["sentiment_pred"] = claves.map(scores["sentiment_pred"]).to_numpy()
+        df["prob_pos"]       = claves.map(scores["prob_pos"]).astype(float).to_numpy()
+    else:
+        load_pipeline(MODEL_KEY_V2)
+        texts  = df["content_clean"].fillna("").astype(str)
+        scores = score_texts(texts, MODEL_KEY_V2, workers=workers)
+        df["sentiment_pred"] = scores["sentiment_pred"]
+        df["prob_pos"]       = scores["prob_pos"]
+    print("🔮 Sentimiento aplicado a todas las reseñas")
+
+    out_key = f"{app.SENTIMENT_PREFIX}/{ym}/reviews_sentiment_{ym}.csv"
+    buf     = io.StringIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    resp    = s3.put_object(Bucket=app.BUCKET, Key=out_key, Body=buf.getvalue())
+    record_month(app.SENTIMENT_PREFIX, ym, df, out_key, resp["ETag"].strip('"'))
+    print(f"✓ Predicciones subidas a s3://{app.BUCKET}/{out_key}")
+    pq_key = write_parquet(df, out_key)
+
+    if n_parts > 1:
+        s3.delete_objects(Bucket=app.BUCKET, Delete={"Objects": [{"Key": k} for k in keys]})
+    return [out_key, pq_key] if pq_key else [out_key]
+
+
 def apply_sentiment():
     """
     1) Detecta el último mes procesado en CLEAN_PREFIX.
     2) Descarga clean_reviews_{ym}.csv desde S3 y lo carga en DataFrame.
     3) Descarga y carga el pipeline balanceado desde S3.
-    4) Aplica predict y predict_proba al campo content_clean.
+    4) Puntúa content_clean con score_texts (cada texto único una sola vez).
     5) Guarda reviews_sentiment_{ym}.csv en SENTIMENT_PREFIX.
     """
-    s3 = boto3.client("s3")
 
     # 1) Listar carpetas YYYY_MM dentro de CLEAN_PREFIX
-    resp  = s3.list_objects_v2(Bucket=BUCKET, Prefix=CLEAN_PREFIX + "/", Delimiter="/")
+    resp  = s3.list_objects_v2(Bucket=app.BUCKET, Prefix=app.CLEAN_PREFIX + "/", Delimiter="/")
     meses = [p["Prefix"].split("/")[-2] for p in resp.get("CommonPrefixes", [])]
     if not meses:
-        raise RuntimeError(f"No hay carpetas limpias en S3 bajo '{CLEAN_PREFIX}'")
+        raise RuntimeError(f"No hay carpetas limpias en S3 bajo '{app.CLEAN_PREFIX}'")
 
     ultimo_mes = sorted(meses)[-1]
     print(f"🗓️ Último mes CLEAN detectado: {ultimo_mes}")
 
-    # 2) Descargar CSV limpio de ese mes
-    clean_key = f"{CLEAN_PREFIX}/{ultimo_mes}/clean_reviews_{ultimo_mes}.csv"
-    obj       = s3.get_object(Bucket=BUCKET, Key=clean_key)
-    df        = pd.read_csv(io.BytesIO(obj["Body"].read()), parse_dates=["at"])
-    print(f"✅ Reseñas limpias cargadas: {len(df):,} filas")
-
-    # 3) Descargar y cargar el modelo balanceado
-    tmp_model = "/tmp/model.pkl"
-    s3.download_file(BUCKET, MODEL_KEY_V2, tmp_model)
-    pipe = joblib.load(tmp_model)
-    print("🔍 Modelo balanceado cargado desde S3")
-
-    # 4) Predecir sentimiento
-    texts = df["content_clean"].fillna("").astype(str)
-    df["sentiment_pred"] = pipe.predict(texts)
-    df["prob_pos"]       = pipe.predict_proba(texts)[:, 1]
-    print("🔮 Sentimiento aplicado a todas las reseñas")
+    # 2–5) Cargar, puntuar y guardar el mes
+    return apply_sentiment_month(ultimo_mes)
+
+
+def backfill_sentiment(months: list[str] | None = None, workers: int | None = None) -> list[str]:
+    """
+    Re-puntúa varios meses de CLEAN_PREFIX cargando el modelo y el pool una sola vez.
+    Un mes que falla se reporta y no detiene a los demás.
+    """
+    from storage import list_months
+    meses = months or list_months(app.CLEAN_PREFIX)
+    workers = workers or os.cpu_count()
+    load_pipeline(MODEL_KEY_V2)
+    print(f"🔁 Backfill de sentimiento: {len(meses)} meses, {workers} procesos")
+
+    keys, fallidos = [], []
+    for ym in meses:
+        try:
+            keys += apply_sentiment_month(ym, workers=workers)
+        except Exception as e:
+            print(f"❌ {ym}: {e}")
+            fallidos.append(ym)
+    cache = _caches.get(MODEL_KEY_V2)
+    if cache is not None:
+        print(f"   • Caché: {cache.hits:,} aciertos / {cache.misses:,} fallos")
+    if fallidos:
+        print(f"⚠️ Meses con error: {', '.join(fallidos)}")
+    return keys
 
-    # 5) Guardar CSV enriquecido en carpeta SENTIMENT_PREFIX
-    out_key = f"{SENTIMENT_PREFIX}/{ultimo_mes}/reviews_sentiment_{ultimo_mes}.csv"
-    buf     = io.StringIO()
-    df.to_csv(buf, index=False, encoding="utf-8")
-    s3.put_object(Bucket=BUCKET, Key=out_key, Body=buf.getvalue())
-    print(f"✓ Predicciones subidas a s3://{BUCKET}/{out_key}")
 
 if __name__ == "__main__":
-    apply_sentiment()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Etapa de sentimiento")
+    parser.add_argument("--backfill", nargs="*", metavar="YYYY_MM",
+                        help="re-puntúa estos meses (sin valores: todos los de CLEAN_PREFIX)")
+    parser.add_argument("--workers", type=int, default=None, help="procesos de inferencia (por defecto todos los núcleos)")
+    args = parser.parse_args()
+    if args.backfill is None:
+        apply_sentiment()
+    else:
+        backfill_sentiment(args.backfill, args.workers)
@@ -0,0 +1,100 @@
+# storage.py
+
+import os
+import json
+import tempfile
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from config import S3_MAX_POOL_CONNECTIONS, QUERY_PARQUET
+from apps import app
+
+# Cliente S3 compartido por todos los módulos y apps (los clientes de boto3 son
+# seguros entre hilos; crear uno por etapa o por app solo duplica conexiones)
+s3 = boto3.client("s3", config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+
+
+def list_months(prefix: str) -> list[str]:
+    """
+    Devuelve las carpetas YYYY_MM bajo `prefix`, ordenadas de la más antigua a la más reciente.
+    """
+    resp  = s3.list_objects_v2(Bucket=app.BUCKET, Prefix=prefix + "/", Delimiter="/")
+    meses = [p["Prefix"].split("/")[-2] for p in resp.get("CommonPrefixes", [])]
+    return sorted(meses)
+
+
+def object_etag(key: str, bucket: str | None = None) -> str | None:
+    """
+    ETag de un objeto en S3 (None si no existe). Para subidas con put_object el
+    ETag es el MD5 del contenido, así que sirve como huella del archivo.
+    `bucket` por defecto es el de la app activa.
+    """
+    try:
+        head = s3.head_object(Bucket=bucket or app.BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return head["ETag"].strip('"')
+
+
+def read_json(key: str, default=None):
+    try:
+        obj = s3.get_object(Bucket=app.BUCKET, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return default
+    return json.loads(obj["Body"].read())
+
+
+def write_json(key: str, data) -> None:
+    s3.put_object(
+        Bucket=app.BUCKET,
+        Key=key,
+        Body=json.dumps(data, ensure_ascii=False, indent=2, default=str),
+        ContentType="application/json",
+    )
+
+
+# ---------------------------------------------------------
+# Copia columnar de las salidas mensuales (la lee query.py)
+# ---------------------------------------------------------
+def parquet_key(csv_key: str) -> str:
+    return csv_key.rsplit(".", 1)[0] + ".parquet"
+
+
+# Columnas que query.py filtra como texto: un mes sin versiones (todo NaN) o con
+# versiones que parecen números quedaría en DOUBLE y `appVersion IN (?)` fallaría
+PARQUET_TEXT_COLUMNS = ("reviewId", "appVersion", "review_date", "review_time")
+
+# Al leer los CSV del pipeline: sin esto pandas infiere "11.10" → 11.1 y el
+# CAST de write_parquet (o el siguiente to_csv) ya no puede recuperar el texto
+CSV_DTYPES = {"reviewId": str, "appVersion": str}
+
+
+def write_parquet(df, csv_key: str, sort_by: str | None = "review_date") -> str | None:
+    """
+    Sube `df` como Parquet (zstd) junto a su CSV. Lo escribe DuckDB directo desde
+    el DataFrame (sin pyarrow); ordenar por `sort_by` deja estadísticas min/max
+    por row group con las que DuckDB salta bloques al filtrar por fecha.
+    Las columnas de PARQUET_TEXT_COLUMNS se escriben siempre como VARCHAR (nulos incluidos).
+    """
+    if not QUERY_PARQUET:
+        return None
+    import duckdb
+
+    key = parquet_key(csv_key)
+    orden = f' ORDER BY "{sort_by}"' if sort_by in df.columns else ""
+    texto = [f'CAST("{c}" AS VARCHAR) AS "{c}"' for c in PARQUET_TEXT_COLUMNS if c in df.columns]
+    select = f"* REPLACE ({', '.join(texto)})" if texto else "*"
+    fd, tmp = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        con = duckdb.connect()
+        con.register("salida", df)
+        con.execute(f"COPY (SELECT {select} FROM salida{orden}) TO '{tmp}' (FORMAT parquet, COMPRESSION zstd)")
+        con.close()
+        s3.upload_file(tmp, app.BUCKET, key)
+    finally:
+        os.remove(tmp)
+    return key
@@ -0,0 +1,145 @@
+# textprep.py
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from stop_words import get_stop_words
+
+
+# ---------------------------------------------------------
+# 1) DEDUPLICACIÓN DE TEXTOS
+# ---------------------------------------------------------
+def dedupe_texts(texts, normalize=None) -> tuple[np.ndarray, list[str]]:
+    """
+    Colapsa textos repetidos.
+    Devuelve (inverse, uniques) tal que uniques[inverse[i]] es el texto
+    (normalizado, si se pasa `normalize`) de la fila i.
+    `normalize` se aplica una vez por texto crudo distinto, no por fila.
+    """
+    serie = pd.Series(texts, dtype=object).fillna("")
+    codes, crudos = pd.factorize(serie, sort=False)
+    if normalize is None:
+        return codes, list(crudos)
+    normalizados = [normalize(t) for t in crudos]
+    codes_norm, uniques = pd.factorize(pd.Series(normalizados, dtype=object), sort=False)
+    return codes_norm[codes], list(uniques)
+
+
+# ---------------------------------------------------------
+# 2) TYPOS Y NORMALIZACIÓN (reglas de topics.py)
+# ---------------------------------------------------------
+typo_corrections = {
+    "execelente": "excelente", "exlecente": "excelente",
+    "vien": "bien", "trasferencia": "transferencia",
+    "tranferencia": "transferencia", "ultma": "ultima",
+    "ultma_actualizacion": "ultima_actualizacion", "abrlr": "abrir",
+    "seevicio": "servicio", "cervicio": "servicio",
+    "bue": "buen", "servio": "servicio"
+}
+typo_pattern = re.compile(
+    r"\b(" + "|".join(map(re.escape, typo_corrections.keys())) + r")\b",
+    flags=re.IGNORECASE
+)
+def correct_typos_once(text: str) -> str:
+    return typo_pattern.sub(lambda m: typo_corrections[m.group(0).lower()], text)
+
+def normalize_punctuation(text: str) -> str:
+    t = re.sub(r"[^a-z0-9áéíóúñü ]+", " ", text)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+# ---------------------------------------------------------
+# 3) STOP-WORDS PARA POS & NEG
+# ---------------------------------------------------------
+extra_stopwords_neg = {
+    "good","very","perfect","super","thanks","thank","like","cool",
+    "awesome","excellent","genial","chido","chévere","gracias",
+    "nice","yeah","great","you","that","doy","fantástico","fantastica",
+    "fantastico","increíble","increible","feliz","felices","mejor",
+    "recomendable","recomendada","recomendado","perfecto","general",
+    "facil","usar","apps","eee","love","banca","bancaria","ohh"
+}
+generic_domain_stopwords_neg = {
+    "aplicacion","aplicación","app","banco","bbva","interfaz",
+    "usuario","usuarios","login","sesion","sesión","transferencias",
+    "pago","pagos","funciona","funcionar","servicios","bien",
+    "excelente","bueno","buena","mal","mala","malisimo","malo",
+    "util","provechoso","favorable","seguridad","seguro","dinero",
+    "movimientos","sirve","regular","saca"
+}
+all_stopwords_neg = extra_stopwords_neg.union(generic_domain_stopwords_neg)
+stop_pattern_neg = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, all_stopwords_neg)) + r")\b",
+    flags=re.IGNORECASE
+)
+def remove_stopwords_neg(text: str) -> str:
+    cleaned = stop_pattern_neg.sub(" ", text)
+    return re.sub(r"\s+", " ", cleaned).strip()
+
+
+# ---------------------------------------------------------
+# 4) MOTOR DE UNA SOLA PASADA
+# ---------------------------------------------------------
+# Las funciones de arriba se conservan como referencia (check_textprep.py
+# verifica la equivalencia). El motor de abajo recorre cada texto una vez.
+spanish_stopwords = set(get_stop_words("spanish"))
+
+_ACCENT_MARKS = re.compile(r"[\u0300-\u036f]")
+_NON_WORD     = re.compile(r"[^\w\s]")
+_WORD_RUN     = re.compile(r"\w+")
+_TOPIC_SPLIT  = re.compile(r"[^a-z0-9áéíóúñü]+")
+
+
+def clean_text(text) -> str:
+    """
+    Limpieza de clean.py: minúsculas, sin acentos ni puntuación,
+    sin stop-words en español ni tokens de menos de 3 letras.
+    """
+    txt = unicodedata.normalize("NFKD", str(text).lower())
+    txt = _ACCENT_MARKS.sub("", txt)
+    txt = _NON_WORD.sub(" ", txt)
+    return " ".join(w for w in txt.split() if w not in spanish_stopwords and len(w) > 2)
+
+
+def prepare_topic_text(text) -> tuple[str, str, int]:
+    """
+    Preparación de topics.py en una pasada por token.
+    Devuelve (texto normalizado, texto sin stop-words POS/NEG, número de tokens);
+    equivale a lower → correct_typos_once → normalize_punctuation
+    (+ remove_stopwords_neg para el segundo valor).
+    """
+    tokens = []
+    for run in _WORD_RUN.findall(str(text).lower()):
+        run = typo_corrections.get(run, run)
+        tokens.extend(t for t in _TOPIC_SPLIT.split(run) if t)
+    doc = " ".join(t for t in tokens if t not in all_stopwords_neg)
+    return " ".join(tokens), doc, len(tokens)
+
+
+def clean_series(texts: pd.Series) -> pd.Series:
+    """
+    clean_text sobre una columna, una vez por texto distinto.
+    (map(str) conserva el comportamiento original con NaN → "nan")
+    """
+    inverse, uniques = dedupe_texts(texts.map(str))
+    limpios = np.array([clean_text(t) for t in uniques], dtype=object)
+    return pd.Series(limpios[inverse], index=texts.index)
+
+
+def prepare_topic_series(texts: pd.Series) -> pd.DataFrame:
+    """
+    prepare_topic_text sobre una columna, una vez por texto distinto.
+    Columnas: content_clean, content_topic (sin stop-words) y token_count.
+    """
+    inverse, uniques = dedupe_texts(texts)
+    if uniques:
+        norm, docs, counts = zip(*(prepare_topic_text(t) for t in uniques))
+    else:
+        norm, docs, counts = (), (), ()
+    return pd.DataFrame({
+        "content_clean": np.array(norm, dtype=object)[inverse],
+        "content_topic": np.array(docs, dtype=object)[inverse],
+        "token_count":   np.array(counts, dtype=int)[inverse],
+    }, index=texts.index)
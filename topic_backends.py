@@ -0,0 +1,269 @@
+# topic_backends.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    EMBEDDING_MODEL, ONNX_EMBEDDING_MODEL, ONNX_MODEL_FILE,
+    TFIDF_MAX_FEATURES, TFIDF_SVD_COMPONENTS,
+    TOPIC_PROBABILITIES, TOPIC_PROB_TOP_K, TOPIC_PROB_CHUNK,
+)
+from textprep import dedupe_texts
+
+# ---------------------------------------------------------
+# Contrato común de los backends:
+#   fit(docs, nr_topics, probabilities, top_k) -> (topics, probs, info, topk)
+#   topics: np.ndarray[int] con el topic_id de cada documento (-1 = outlier)
+#   probs:  "dense"    → matriz documento × tópico
+#           "assigned" → vector con la probabilidad del tópico asignado
+#   info:   DataFrame con Topic, Count, Name ("3_token_no_llega") y
+#           Representation (palabras principales), como BERTopic.get_topic_info()
+#   topk:   None o (ids, probs), arreglos n × top_k con los tópicos más probables;
+#           en modo "assigned" se calcula por bloques de TOPIC_PROB_CHUNK filas
+# ---------------------------------------------------------
+PROBABILITY_MODES = ("assigned", "dense")
+
+
+def topk_by_chunks(n_docs: int, top_k: int, chunk_probs, chunk: int = TOPIC_PROB_CHUNK):
+    """
+    Top-k tópicos por documento sin materializar la matriz completa:
+    `chunk_probs(inicio, fin)` devuelve el bloque (fin-inicio) × tópicos.
+    """
+    ids   = np.full((n_docs, top_k), -1, dtype=np.int32)
+    probs = np.zeros((n_docs, top_k), dtype=np.float32)
+    for inicio in range(0, n_docs, chunk):
+        fin = min(inicio + chunk, n_docs)
+        bloque = np.asarray(chunk_probs(inicio, fin))
+        k = min(top_k, bloque.shape[1])
+        if k == 0:
+            continue
+        top = np.argpartition(-bloque, k - 1, axis=1)[:, :k]
+        vals = np.take_along_axis(bloque, top, axis=1)
+        orden = np.argsort(-vals, axis=1)
+        ids[inicio:fin, :k]   = np.take_along_axis(top, orden, axis=1)
+        probs[inicio:fin, :k] = np.take_along_axis(vals, orden, axis=1)
+    return ids, probs
+
+
+# ---------------------------------------------------------
+# 1) ENCODERS COMPARTIDOS
+# ---------------------------------------------------------
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+def get_encoder(model_name: str = EMBEDDING_MODEL, backend: str = "torch", file_name: str | None = None):
+    """
+    Sentence-transformer compartido; se carga una sola vez por proceso y configuración.
+    """
+    key = (model_name, backend, file_name)
+    with _encoders_lock:
+        if key not in _encoders:
+            from sentence_transformers import SentenceTransformer
+            kwargs = {"backend": backend} if backend != "torch" else {}
+            if file_name:
+                kwargs["model_kwargs"] = {"file_name": file_name}
+            _encoders[key] = SentenceTransformer(model_name, **kwargs)
+        return _encoders[key]
+
+
+def get_onnx_encoder():
+    """
+    Encoder multilingüe pequeño exportado a ONNX y cuantizado (int8) para CPU.
+    """
+    return get_encoder(ONNX_EMBEDDING_MODEL, backend="onnx", file_name=ONNX_MODEL_FILE)
+
+
+def embed_unique(docs: list[str], encoder=None) -> np.ndarray:
+    """
+    Calcula el embedding una vez por texto único y lo expande a todas las filas.
+    UMAP/HDBSCAN siguen viendo cada fila, así que las frecuencias de tópico
+    no cambian y BERTopic no necesita pesos por documento.
+    """
+    encoder = encoder or get_encoder()
+    inverse, uniques = dedupe_texts(docs)
+    print(f"   • {len(docs):,} documentos → {len(uniques):,} textos únicos a vectorizar")
+    emb_unique = encoder.encode(uniques, show_progress_bar=False)
+    return np.asarray(emb_unique)[inverse]
+
+
+# ---------------------------------------------------------
+# 2) BACKENDS BERTopic (sentence-transformers + UMAP + HDBSCAN)
+# ---------------------------------------------------------
+def _original_topic_map(labels: np.ndarray, topics: np.ndarray) -> np.ndarray:
+    """
+    Matriz clusters HDBSCAN originales × tópicos finales (tras nr_topics): cada
+    cluster va al tópico final más frecuente entre sus documentos.
+    """
+    labels = np.asarray(labels)
+    n_orig  = int(labels.max()) + 1 if labels.size else 0
+    n_final = int(topics.max()) + 1 if topics.size else 0
+    mapa = np.zeros((n_orig, n_final))
+    for c in range(n_orig):
+        destino = topics[(labels == c) & (topics != -1)]
+        if destino.size:
+            mapa[c, np.bincount(destino).argmax()] = 1.0
+    return mapa
+
+
+def _fit_bertopic(docs: list[str], nr_topics: int, encoder, probabilities: str, top_k: int):
+    from bertopic import BERTopic
+
+    embeddings = embed_unique(docs, encoder)
+    dense = probabilities == "dense"
+    # sin calculate_probabilities HDBSCAN no arma la matriz densa y BERTopic
+    # devuelve directamente la probabilidad del cluster asignado
+    model = BERTopic(
+        embedding_model=encoder, nr_topics=nr_topics,
+        calculate_probabilities=dense, verbose=False,
+    )
+    topics, probs = model.fit_transform(docs, embeddings=embeddings)
+    topics, probs = np.asarray(topics), np.asarray(probs)
+
+    topk = None
+    if top_k and dense:
+        topk = topk_by_chunks(len(docs), top_k, lambda i, j: probs[i:j])
+    elif top_k:
+        import hdbscan
+        reduced = model.umap_model.embedding_
+        mapa    = _original_topic_map(model.hdbscan_model.labels_, topics)
+
+        def remap(bloque):
+            # _map_probabilities es privado en BERTopic: si cambia o no existe en la
+            # versión instalada se suma cada cluster original a su tópico final
+            if hasattr(model, "_map_probabilities"):
+                try:
+                    return model._map_probabilities(bloque, original_topics=True)
+                except TypeError:
+                    pass
+            return bloque @ mapa
+
+        def chunk_probs(i, j):
+            # pertenencia suave del bloque, re-mapeada a los tópicos ya reducidos
+            bloque = hdbscan.membership_vector(model.hdbscan_model, reduced[i:j])
+            return remap(np.atleast_2d(bloque))
+
+        topk = topk_by_chunks(len(docs), top_k, chunk_probs)
+    return topics, probs, model.get_topic_info(), topk
+
+
+def fit_bertopic(docs: list[str], nr_topics: int, probabilities: str, top_k: int):
+    return _fit_bertopic(docs, nr_topics, get_encoder(), probabilities, top_k)
+
+
+def fit_onnx(docs: list[str], nr_topics: int, probabilities: str, top_k: int):
+    return _fit_bertopic(docs, nr_topics, get_onnx_encoder(), probabilities, top_k)
+
+
+def _no_topics(n_docs: int, probabilities: str, top_k: int):
+    """
+    Resultado vacío con el mismo contrato: todos los documentos como outliers.
+    """
+    topics = np.full(n_docs, -1, dtype=int)
+    probs  = np.zeros((n_docs, 1)) if probabilities == "dense" else np.zeros(n_docs)
+    info   = pd.DataFrame(columns=["Topic", "Count", "Name", "Representation"])
+    topk   = (np.full((n_docs, top_k), -1, dtype=np.int32), np.zeros((n_docs, top_k), dtype=np.float32)) if top_k else None
+    return topics, probs, info, topk
+
+
+# ---------------------------------------------------------
+# 3) BACKEND TF-IDF + TruncatedSVD + MiniBatchKMeans (sin embeddings)
+# ---------------------------------------------------------
+def fit_tfidf(docs: list[str], nr_topics: int, probabilities: str, top_k: int):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.preprocessing import normalize
+
+    # corpus chicos: si ningún término aparece en 2 documentos se baja min_df a 1;
+    # sin vocabulario (vacío, solo tokens de 1 carácter) o con un solo documento
+    # todo queda como outlier
+    X = None
+    for min_df in (2, 1):
+        vectorizer = TfidfVectorizer(max_features=TFIDF_MAX_FEATURES, min_df=min_df, sublinear_tf=True)
+        try:
+            X = vectorizer.fit_transform(docs)
+            break
+        except ValueError:
+            continue
+    if X is None or len(docs) < 2:
+        return _no_topics(len(docs), probabilities, top_k)
+    if X.shape[1] > 1:
+        n_components = min(TFIDF_SVD_COMPONENTS, X.shape[1] - 1)
+        Z = normalize(TruncatedSVD(n_components=n_components, random_state=0).fit_transform(X))
+    else:
+        Z = normalize(X.toarray())
+
+    k = max(1, min(nr_topics, len(docs)))
+    kmeans = MiniBatchKMeans(n_clusters=k, random_state=0, n_init=3, batch_size=2048)
+    topics = kmeans.fit_predict(Z)
+
+    # probabilidad por tópico: softmax de la similitud coseno a los centroides
+    centros = normalize(kmeans.cluster_centers_)
+
+    def chunk_probs(i, j):
+        sims = Z[i:j] @ centros.T
+        sims = np.exp((sims - sims.max(axis=1, keepdims=True)) * 10)
+        return sims / sims.sum(axis=1, keepdims=True)
+
+    if probabilities == "dense":
+        probs = chunk_probs(0, len(docs))
+    else:
+        probs = np.empty(len(docs))
+        for i in range(0, len(docs), TOPIC_PROB_CHUNK):
+            j = min(i + TOPIC_PROB_CHUNK, len(docs))
+            probs[i:j] = chunk_probs(i, j)[np.arange(j - i), topics[i:j]]
+    topk = topk_by_chunks(len(docs), top_k, chunk_probs) if top_k else None
+
+    # etiqueta estilo BERTopic con los términos de mayor TF-IDF medio del cluster
+    vocab = np.asarray(vectorizer.get_feature_names_out())
+    rows = []
+    for t in range(k):
+        miembros = topics == t
+        if not miembros.any():
+            continue
+        pesos = np.asarray(X[miembros].mean(axis=0)).ravel()
+        palabras = vocab[np.argsort(pesos)[::-1][:10]].tolist()
+        rows.append({
+            "Topic": t, "Count": int(miembros.sum()),
+            "Name": f"{t}_" + "_".join(palabras[:4]), "Representation": palabras,
+        })
+    info = pd.DataFrame(rows).sort_values("Count", ascending=False).reset_index(drop=True)
+    return topics, probs, info, topk
+
+
+BACKENDS = {
+    "bertopic": fit_bertopic,
+    "onnx":     fit_onnx,
+    "tfidf":    fit_tfidf,
+}
+
+
+def fit(docs: list[str], nr_topics: int, backend: str,
+        probabilities: str = TOPIC_PROBABILITIES, top_k: int = TOPIC_PROB_TOP_K):
+    if backend not in BACKENDS:
+        raise ValueError(f"TOPIC_BACKEND desconocido: '{backend}' (opciones: {', '.join(BACKENDS)})")
+    if probabilities not in PROBABILITY_MODES:
+        raise ValueError(f"TOPIC_PROBABILITIES desconocido: '{probabilities}' (opciones: {', '.join(PROBABILITY_MODES)})")
+    return BACKENDS[backend](docs, nr_topics, probabilities, top_k)
+
+
+def assigned_probs(topics: np.ndarray, probs: np.ndarray) -> np.ndarray:
+    """
+    Probabilidad del tópico asignado por documento (0 para outliers), sea cual sea el modo.
+    """
+    if probs.ndim == 1:
+        return np.where(topics == -1, 0.0, probs)
+    idx = np.clip(topics, 0, probs.shape[1] - 1)
+    return np.where(topics == -1, 0.0, probs[np.arange(len(topics)), idx])
+
+
+def format_topk(ids: np.ndarray, probs: np.ndarray) -> list[str]:
+    """
+    Top-k por documento como texto para el CSV: "3:0.8123|7:0.1042".
+    """
+    return [
+        "|".join(f"{t}:{p:.4f}" for t, p in zip(fila_ids, fila_probs) if t != -1)
+        for fila_ids, fila_probs in zip(ids.tolist(), probs.tolist())
+    ]
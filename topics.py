@@ -1,16 +1,25 @@
 # topics.py
 import os
 import io
-import re
-import boto3
 import pandas as pd
-import numpy as np
 
 from bertopic import BERTopic
 
-from config import BUCKET, TOPICS_PREFIX, SENTIMENT_PREFIX
+from botocore.exceptions import ClientError
 
-s3 = boto3.client("s3")
+from config import (
+    TOPIC_MODE, TOPIC_BACKEND, ROLLING_MONTHS, ROLLING_CLUSTERS, ROLLING_DECAY,
+    ROLLING_COMPONENTS, QUERY_PARQUET,
+)
+from apps import app
+from storage import s3, write_parquet, parquet_key, CSV_DTYPES
+from cube import build_topic_cube
+from textprep import prepare_topic_series
+import topic_backends
+from topic_backends import get_encoder, get_onnx_encoder, embed_unique
+from manifest import load_manifest, update_manifest, summarize_month, record_month
+# Reglas de typos/stop-words viven en textprep; se reexportan por compatibilidad
+from textprep import correct_typos_once, normalize_punctuation, remove_stopwords_neg
 
 
 # ---------------------------------------------------------
@@ -18,121 +27,161 @@ s3 = boto3.client("s3")
 # ---------------------------------------------------------
 def list_available_months() -> list[str]:
     resp = s3.list_objects_v2(
-        Bucket=BUCKET,
-        Prefix=SENTIMENT_PREFIX + "/",
+        Bucket=app.BUCKET,
+        Prefix=app.SENTIMENT_PREFIX + "/",
         Delimiter="/"
     )
     meses = [p["Prefix"].split("/")[-2] for p in resp.get("CommonPrefixes", [])]
     if not meses:
-        raise RuntimeError(f"No hay carpetas en s3://{BUCKET}/{SENTIMENT_PREFIX}/")
+        raise RuntimeError(f"No hay carpetas en s3://{app.BUCKET}/{app.SENTIMENT_PREFIX}/")
     return sorted(meses)
 
 
 # ---------------------------------------------------------
 # 2) CARGAR CSV DE SENTIMIENTO PARA UN MES
 # ---------------------------------------------------------
+def sentiment_key(yyyy_mm: str) -> str:
+    return f"{app.SENTIMENT_PREFIX}/{yyyy_mm}/reviews_sentiment_{yyyy_mm}.csv"
+
+
+def read_sentiment_month(yyyy_mm: str) -> tuple[pd.DataFrame, str]:
+    key = sentiment_key(yyyy_mm)
+    obj = s3.get_object(Bucket=app.BUCKET, Key=key)
+    df = pd.read_csv(io.BytesIO(obj["Body"].read()), parse_dates=["at"], dtype=CSV_DTYPES)
+    print(f"✅ Cargadas {len(df):,} reseñas desde s3://{app.BUCKET}/{key}")
+    return df, obj["ETag"].strip('"')
+
+
 def load_sentiment_csv_for_month(yyyy_mm: str) -> pd.DataFrame:
-    key = f"{SENTIMENT_PREFIX}/{yyyy_mm}/reviews_sentiment_{yyyy_mm}.csv"
-    obj = s3.get_object(Bucket=BUCKET, Key=key)
-    df = pd.read_csv(io.BytesIO(obj["Body"].read()), parse_dates=["at"])
-    print(f"✅ Cargadas {len(df):,} reseñas desde s3://{BUCKET}/{key}")
-    return df
+    return read_sentiment_month(yyyy_mm)[0]
 
 
 # ---------------------------------------------------------
 # 3) SELECCIONAR ÚLTIMO MES CON ≥300 RESEÑAS (o retroceder)
 # ---------------------------------------------------------
 def select_month_with_min_reviews(min_reviews: int = 300) -> tuple[str, pd.DataFrame]:
-    meses = list_available_months()  # e.g. ["2025_03","2025_04","2025_05"]
-    for mes in reversed(meses):
-        df = load_sentiment_csv_for_month(mes)
-        if len(df) >= min_reviews:
-            print(f"→ Seleccionado {mes}: {len(df)} reseñas (>= {min_reviews})")
-            return mes, df
-        print(f"⚠️ {mes} tiene solo {len(df)} reseñas (< {min_reviews}), pruebo mes anterior...")
-    # si ninguno cumple, devolver el más antiguo
-    mes_ant = meses[0]
-    df_ant = load_sentiment_csv_for_month(mes_ant)
-    print(f"⚠️ Ningún mes con ≥{min_reviews}, usando más antiguo {mes_ant} ({len(df_ant)} reseñas)")
-    return mes_ant, df_ant
+    """
+    Elige el mes con el manifiesto de SENTIMENT_PREFIX (una sola lectura pequeña)
+    y descarga únicamente el mes elegido. Los meses que aún no están en el
+    manifiesto se leen una vez y se registran.
+    """
+    meses    = list_available_months()  # e.g. ["2025_03","2025_04","2025_05"]
+    manifest = load_manifest(app.SENTIMENT_PREFIX)
+    leidos   = {}                       # mes -> DataFrame ya descargado
+    cambios  = {}                       # mes -> entrada nueva del manifiesto
 
+    def registrar(mes, df, etag):
+        manifest[mes] = cambios[mes] = summarize_month(df, sentiment_key(mes), etag)
+        leidos[mes] = df
 
-# ---------------------------------------------------------
-# 4) TYPOS Y NORMALIZACIÓN
-# ---------------------------------------------------------
-typo_corrections = {
-    "execelente": "excelente", "exlecente": "excelente",
-    "vien": "bien", "trasferencia": "transferencia",
-    "tranferencia": "transferencia", "ultma": "ultima",
-    "ultma_actualizacion": "ultima_actualizacion", "abrlr": "abrir",
-    "seevicio": "servicio", "cervicio": "servicio",
-    "bue": "buen", "servio": "servicio"
-}
-typo_pattern = re.compile(
-    r"\b(" + "|".join(map(re.escape, typo_corrections.keys())) + r")\b",
-    flags=re.IGNORECASE
-)
-def correct_typos_once(text: str) -> str:
-    return typo_pattern.sub(lambda m: typo_corrections[m.group(0).lower()], text)
+    def filas(mes):
+        if mes not in manifest:
+            registrar(mes, *read_sentiment_month(mes))
+        return manifest[mes]["rows"]
+
+    while True:
+        mes = next((m for m in reversed(meses) if filas(m) >= min_reviews), None)
+        if mes is None:
+            mes = meses[0]
+        if mes not in leidos:
+            df, etag = read_sentiment_month(mes)
+            if etag != manifest[mes].get("etag"):
+                # el manifiesto estaba desactualizado para este mes: se corrige y se vuelve a elegir
+                print(f"⚠️ Manifiesto desactualizado para {mes}, se recalcula")
+                registrar(mes, df, etag)
+                continue
+            leidos[mes] = df
+        break
 
-def normalize_punctuation(text: str) -> str:
-    t = re.sub(r"[^a-z0-9áéíóúñü ]+", " ", text)
-    return re.sub(r"\s+", " ", t).strip()
+    if cambios:
+        update_manifest(app.SENTIMENT_PREFIX, cambios)
+
+    df = leidos[mes]
+    if len(df) >= min_reviews:
+        print(f"→ Seleccionado {mes}: {len(df)} reseñas (>= {min_reviews})")
+    else:
+        print(f"⚠️ Ningún mes con ≥{min_reviews}, usando más antiguo {mes} ({len(df)} reseñas)")
+    return mes, df
 
 
 # ---------------------------------------------------------
-# 5) STOP-WORDS PARA POS & NEG
+# 4) ENTRENAMIENTO POR PARTICIÓN (backend configurable)
 # ---------------------------------------------------------
-extra_stopwords_neg = {
-    "good","very","perfect","super","thanks","thank","like","cool",
-    "awesome","excellent","genial","chido","chévere","gracias",
-    "nice","yeah","great","you","that","doy","fantástico","fantastica",
-    "fantastico","increíble","increible","feliz","felices","mejor",
-    "recomendable","recomendada","recomendado","perfecto","general",
-    "facil","usar","apps","eee","love","banca","bancaria","ohh"
-}
-generic_domain_stopwords_neg = {
-    "aplicacion","aplicación","app","banco","bbva","interfaz",
-    "usuario","usuarios","login","sesion","sesión","transferencias",
-    "pago","pagos","funciona","funcionar","servicios","bien",
-    "excelente","bueno","buena","mal","mala","malisimo","malo",
-    "util","provechoso","favorable","seguridad","seguro","dinero",
-    "movimientos","sirve","regular","saca"
-}
-all_stopwords_neg = extra_stopwords_neg.union(generic_domain_stopwords_neg)
-stop_pattern_neg = re.compile(
-    r"\b(?:" + "|".join(map(re.escape, all_stopwords_neg)) + r")\b",
-    flags=re.IGNORECASE
-)
-def remove_stopwords_neg(text: str) -> str:
-    cleaned = stop_pattern_neg.sub(" ", text)
-    return re.sub(r"\s+", " ", cleaned).strip()
+def fit_topics(df_part: pd.DataFrame, nr_topics: int, etiqueta: str) -> pd.DataFrame:
+    """
+    Entrena el backend TOPIC_BACKEND sobre una partición (POS o NEG) y agrega
+    topic_id/topic_label.
+    """
+    if df_part.empty:
+        print(f"No hay reseñas {etiqueta} (>=3 palabras)\n")
+        return df_part
+
+    print(f"=== ENTRENANDO {TOPIC_BACKEND} sobre {etiqueta} ===")
+    docs = df_part["content_topic"].tolist()
+    topics_arr, probs_arr, info, topk = topic_backends.fit(docs, nr_topics, TOPIC_BACKEND)
+
+    def score(t):
+        if probs_arr.ndim == 1:   # el backend solo da la probabilidad del tópico asignado
+            return probs_arr[topics_arr==t].mean()
+        return probs_arr[topics_arr==t, t].mean()
+
+    df_topics = pd.DataFrame({
+        "topic_id":    info["Topic"].astype(int),
+        "frequency":   info["Count"].astype(int),
+        "topic_label": info["Name"].astype(str),
+        "score": [
+            round(score(t), 4)
+            if (topics_arr==t).sum()>0 else 0.0
+            for t in info["Topic"].astype(int)
+        ]
+    })
+    df_topics.loc[df_topics["topic_id"]==-1, "topic_label"] = "outlier"
+    print(df_topics.to_string(index=False), "\n")
+
+    df_part["topic_id"]   = topics_arr
+    df_part["topic_prob"] = topic_backends.assigned_probs(topics_arr, probs_arr).round(4)
+    if topk is not None:
+        df_part["topic_topk"] = topic_backends.format_topk(*topk)
+    return df_part.merge(
+        df_topics[["topic_id","topic_label"]],
+        on="topic_id", how="left"
+    )
 
 
 # ---------------------------------------------------------
-# 6) PUNTO CENTRAL: apply_topics()
+# 5) PUNTO CENTRAL: apply_topics()
 # ---------------------------------------------------------
+MIN_REVIEWS = 300   # mínimo de reseñas para entrenar un mes
+
 def apply_topics():
-    # 6.a) Elegir mes y cargar datos
-    mes, df = select_month_with_min_reviews(min_reviews=300)
-
-    # 6.b) Limpieza de texto
-    df["content_clean"] = (
-        df["content_clean"].fillna("")
-          .astype(str)
-          .str.lower()
-          .apply(correct_typos_once)
-          .apply(normalize_punctuation)
-    )
-    df["token_count"] = df["content_clean"].str.split().apply(len)
+    if TOPIC_MODE == "rolling":
+        return apply_topics_rolling()
+
+    # 5.a) Elegir mes y cargar datos
+    mes, df = select_month_with_min_reviews(min_reviews=MIN_REVIEWS)
+    return topics_for_month(mes, df)
+
+
+def topics_for_month(mes: str, df: pd.DataFrame | None = None) -> list[str]:
+    """
+    Tópicos mensuales (POS/NEG) de un mes dado; lo usan apply_topics y el runner local.
+    """
+    if df is None:
+        df = load_sentiment_csv_for_month(mes)
 
-    # 6.c) Separar cortas vs largas
+    # 5.b) Limpieza de texto: typos + puntuación + stop-words en una sola pasada
+    prep = prepare_topic_series(df["content_clean"])
+    df["content_clean"] = prep["content_clean"]
+    df["content_topic"] = prep["content_topic"]
+    df["token_count"]   = prep["token_count"]
+
+    # 5.c) Separar cortas vs largas
     df_short = df[df["token_count"] < 3].copy()
     df_short["topic_id"] = -1
     df_short["topic_label"] = "Comentario Corto"
     df_long = df[df["token_count"] >= 3].copy()
 
-    # 6.d) POS vs NEG
+    # 5.d) POS vs NEG
     df_pos = df_long[df_long["sentiment_pred"] == "pos"].copy()
     df_neg = df_long[df_long["sentiment_pred"] == "neg"].copy()
 
@@ -142,72 +191,226 @@ def apply_topics():
         f"{len(df_short):,} CORTAS.\n"
     )
 
-    # 6.e) BERTopic en POS (6 tópicos)
-    if not df_pos.empty:
-        print("=== ENTRENANDO BERTopic sobre POSITIVAS ===")
-        docs_pos = df_pos["content_clean"].apply(remove_stopwords_neg).tolist()
-        model_pos = BERTopic(nr_topics=20, calculate_probabilities=True, verbose=False)
-        topics_pos, probs_pos = model_pos.fit_transform(docs_pos)
-
-        info_pos = model_pos.get_topic_info()
-        df_topics_pos = pd.DataFrame({
-            "topic_id":    info_pos["Topic"].astype(int),
-            "frequency":   info_pos["Count"].astype(int),
-            "topic_label": info_pos["Name"].astype(str),
-            "score": [
-                round(np.array(probs_pos)[np.array(topics_pos)==t, t].mean(), 4)
-                if (np.array(topics_pos)==t).sum()>0 else 0.0
-                for t in info_pos["Topic"].astype(int)
-            ]
-        })
-        df_topics_pos.loc[df_topics_pos["topic_id"]==-1, "topic_label"] = "outlier"
-        print(df_topics_pos.to_string(index=False), "\n")
-
-        df_pos["topic_id"] = topics_pos
-        df_pos = df_pos.merge(
-            df_topics_pos[["topic_id","topic_label"]],
-            on="topic_id", how="left"
-        )
-    else:
-        print("No hay reseñas POSITIVAS (>=3 palabras)\n")
-
-    # 6.f) BERTopic en NEG
-    if not df_neg.empty:
-        print("=== ENTRENANDO BERTopic sobre NEGATIVAS ===")
-        docs_neg = df_neg["content_clean"].apply(remove_stopwords_neg).tolist()
-        model_neg = BERTopic(nr_topics=30, calculate_probabilities=True, verbose=False)
-        topics_neg, probs_neg = model_neg.fit_transform(docs_neg)
-
-        info_neg = model_neg.get_topic_info()
-        df_topics_neg = pd.DataFrame({
-            "topic_id":    info_neg["Topic"].astype(int),
-            "frequency":   info_neg["Count"].astype(int),
-            "topic_label": info_neg["Name"].astype(str),
-            "score": [
-                round(np.array(probs_neg)[np.array(topics_neg)==t, t].mean(), 4)
-                if (np.array(topics_neg)==t).sum()>0 else 0.0
-                for t in info_neg["Topic"].astype(int)
-            ]
-        })
-        df_topics_neg.loc[df_topics_neg["topic_id"]==-1, "topic_label"] = "outlier"
-        print(df_topics_neg.to_string(index=False), "\n")
-
-        df_neg["topic_id"] = topics_neg
-        df_neg = df_neg.merge(
-            df_topics_neg[["topic_id","topic_label"]],
-            on="topic_id", how="left"
-        )
-    else:
-        print("No hay reseñas NEGATIVAS (>=3 palabras)\n")
+    # 5.e) BERTopic en POS (20 tópicos) y NEG (30 tópicos)
+    df_pos = fit_topics(df_pos, nr_topics=20, etiqueta="POSITIVAS")
+    df_neg = fit_topics(df_neg, nr_topics=30, etiqueta="NEGATIVAS")
 
-    # 6.g) Unir y subir
+    # 5.f) Unir y subir
     df_all = pd.concat([df_short, df_pos, df_neg], ignore_index=True)
-    out_key = f"{TOPICS_PREFIX}/{mes}/topics_{mes}.csv"
+    df_all = df_all.drop(columns=["content_topic"])
+    return upload_month(mes, df_all)
+
+
+def cube_key(mes: str) -> str:
+    return f"{app.CUBE_PREFIX}/{mes}/cube_{mes}.parquet"
+
+
+def month_keys(mes: str) -> list[str]:
+    """
+    Salidas de un mes de tópicos: el CSV y, con QUERY_PARQUET, su copia Parquet
+    y el cubo de conteos (solo lo lee el dashboard vía query.py).
+    """
+    csv_key = f"{app.TOPICS_PREFIX}/{mes}/topics_{mes}.csv"
+    return [csv_key, parquet_key(csv_key), cube_key(mes)] if QUERY_PARQUET else [csv_key]
+
+
+def upload_month(mes: str, df_all: pd.DataFrame) -> list[str]:
+    """
+    Sube topics_{mes}.csv (+ manifiesto) y, con QUERY_PARQUET, su Parquet y el
+    cubo de conteos del mes.
+    """
+    out_key = month_keys(mes)[0]
     buf = io.StringIO()
     df_all.to_csv(buf, index=False, encoding="utf-8")
-    s3.put_object(Bucket=BUCKET, Key=out_key, Body=buf.getvalue())
-    print(f"✓ CSV de tópicos subido a s3://{BUCKET}/{out_key}")
+    resp = s3.put_object(Bucket=app.BUCKET, Key=out_key, Body=buf.getvalue())
+    record_month(app.TOPICS_PREFIX, mes, df_all, out_key, resp["ETag"].strip('"'))
+    print(f"✓ CSV de tópicos subido a s3://{app.BUCKET}/{out_key}")
+
+    if write_parquet(df_all, out_key):
+        # Cubo de conteos para la sección "Temas más hablados" del dashboard
+        cube = build_topic_cube(df_all)
+        write_parquet(cube, cube_key(mes))
+        print(f"✓ Cubo de tópicos ({len(cube):,} celdas) subido a s3://{app.BUCKET}/{cube_key(mes)}")
+    return month_keys(mes)
+
+
+# ---------------------------------------------------------
+# 6) MODO ROLLING: VENTANA DE N MESES CON MODELO EN LÍNEA
+# ---------------------------------------------------------
+# Un modelo por sentimiento con componentes incrementales (IncrementalPCA +
+# MiniBatchKMeans + OnlineCountVectorizer). Cada corrida solo hace partial_fit
+# con las reseñas que aún no tienen tópico, así que los topic_id son los mismos
+# en todos los meses de la ventana.
+# El encoder sale de TOPIC_BACKEND; cambiarlo empieza modelos nuevos porque los
+# embeddings de otro encoder no caen en el mismo espacio.
+ROLLING_ENCODERS = {
+    "bertopic": get_encoder,
+    "onnx":     get_onnx_encoder,
+}
+
+
+def rolling_encoder():
+    if TOPIC_BACKEND not in ROLLING_ENCODERS:
+        raise ValueError(
+            f"TOPIC_MODE='rolling' necesita embeddings: TOPIC_BACKEND='{TOPIC_BACKEND}' no es compatible "
+            f"(opciones: {', '.join(ROLLING_ENCODERS)})"
+        )
+    return ROLLING_ENCODERS[TOPIC_BACKEND]()
+
+
+def rolling_model_key(sent: str) -> str:
+    sufijo = "" if TOPIC_BACKEND == "bertopic" else f"_{TOPIC_BACKEND}"
+    return f"{app.ROLLING_MODEL_PREFIX}/{sent}{sufijo}.pkl"
+
+
+def new_rolling_model(n_clusters: int) -> BERTopic:
+    from sklearn.decomposition import IncrementalPCA
+    from sklearn.cluster import MiniBatchKMeans
+    from bertopic.vectorizers import OnlineCountVectorizer
+    return BERTopic(
+        embedding_model=rolling_encoder(),
+        umap_model=IncrementalPCA(n_components=ROLLING_COMPONENTS),
+        hdbscan_model=MiniBatchKMeans(n_clusters=n_clusters, random_state=0),
+        vectorizer_model=OnlineCountVectorizer(decay=ROLLING_DECAY),
+        verbose=False,
+    )
+
+
+def load_rolling_model(sent: str) -> BERTopic | None:
+    tmp = f"/tmp/topics_rolling_{app.name}_{sent}.pkl"
+    try:
+        s3.download_file(app.BUCKET, rolling_model_key(sent), tmp)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return BERTopic.load(tmp, embedding_model=rolling_encoder())
+
+
+def save_rolling_model(model: BERTopic, sent: str) -> None:
+    tmp = f"/tmp/topics_rolling_{app.name}_{sent}.pkl"
+    model.save(tmp, serialization="pickle", save_embedding_model=False)
+    s3.upload_file(tmp, app.BUCKET, rolling_model_key(sent))
+
+
+def read_rolling_month(mes: str) -> pd.DataFrame | None:
+    """
+    reviewId, topic_id y topic_label del CSV de tópicos del mes si lo escribió
+    el modo rolling con el mismo TOPIC_BACKEND (None si no existe, si se generó
+    en modo mensual o con otro encoder: sus espacios de IDs no son compatibles).
+    """
+    key = month_keys(mes)[0]
+    try:
+        obj = s3.get_object(Bucket=app.BUCKET, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    prev = pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=CSV_DTYPES,
+                       usecols=lambda c: c in ("reviewId", "topic_id", "topic_label", "topic_mode", "topic_backend"))
+    if "topic_mode" not in prev.columns or not (prev["topic_mode"] == "rolling").all():
+        return None
+    # antes de topic_backend el modo rolling solo usaba el encoder de BERTopic
+    backend = prev["topic_backend"] if "topic_backend" in prev.columns else pd.Series("bertopic", index=prev.index)
+    if not (backend == TOPIC_BACKEND).all():
+        return None
+    return prev[["reviewId", "topic_id", "topic_label"]]
+
+
+def previous_assignments(prev: pd.DataFrame | None) -> pd.DataFrame:
+    """
+    topic_id ya asignados por el modo rolling (sin outliers, que se reintentan).
+    """
+    if prev is None:
+        return pd.DataFrame(columns=["reviewId", "topic_id"])
+    prev = prev[prev["topic_id"] != -1]
+    return prev[["reviewId", "topic_id"]].drop_duplicates("reviewId")
+
+
+def assignments_changed(prev: pd.DataFrame | None, df: pd.DataFrame) -> bool:
+    """
+    True si el mes no tenía salida rolling o si cambió alguna fila, topic_id o etiqueta.
+    """
+    if prev is None or len(prev) != len(df):
+        return True
+    cols = ["reviewId", "topic_id", "topic_label"]
+    a = prev[cols].astype(str).sort_values(cols).to_numpy()
+    b = df[cols].astype(str).sort_values(cols).to_numpy()
+    return not (a == b).all()
+
+
+def apply_topics_rolling() -> list[str]:
+    encoder = rolling_encoder()   # falla antes de descargar nada si el backend no es compatible
+
+    # 6.a) Ventana: últimos ROLLING_MONTHS meses con sentimiento
+    meses = list_available_months()[-ROLLING_MONTHS:]
+    print(f"→ Ventana rolling: {meses[0]} – {meses[-1]} ({len(meses)} meses)")
+
+    frames, previos = {}, {}
+    for mes in meses:
+        df = load_sentiment_csv_for_month(mes)
+        prep = prepare_topic_series(df["content_clean"])
+        df["content_clean"] = prep["content_clean"]
+        df["content_topic"] = prep["content_topic"]
+        df["token_count"]   = prep["token_count"]
+        previos[mes] = read_rolling_month(mes)
+        df = df.drop(columns=["topic_id", "topic_label"], errors="ignore")
+        df = df.merge(previous_assignments(previos[mes]), on="reviewId", how="left")
+        frames[mes] = df
+
+    # 6.b) partial_fit por sentimiento solo con documentos nuevos (sin topic_id)
+    etiquetas = {}
+    for sent, n_clusters in ROLLING_CLUSTERS.items():
+        nuevos = {
+            mes: df.index[(df["token_count"] >= 3) & (df["sentiment_pred"] == sent) & df["topic_id"].isna()]
+            for mes, df in frames.items()
+        }
+        docs = [d for mes, idx in nuevos.items() for d in frames[mes].loc[idx, "content_topic"]]
+        model = load_rolling_model(sent)
+        print(f"=== {sent.upper()}: {len(docs):,} documentos nuevos "
+              f"({'modelo existente' if model is not None else 'modelo nuevo'}) ===")
+
+        if docs:
+            embeddings = embed_unique(docs, encoder)
+            if model is None and len(docs) < n_clusters:
+                print(f"⚠️ Muy pocas reseñas para inicializar {n_clusters} tópicos, quedan pendientes")
+                topics = [-1] * len(docs)
+            elif model is not None and len(docs) < ROLLING_COMPONENTS:
+                # lote demasiado chico para IncrementalPCA: se asigna sin actualizar el modelo
+                topics, _ = model.transform(docs, embeddings=embeddings)
+            else:
+                model = model or new_rolling_model(n_clusters)
+                model.partial_fit(docs, embeddings=embeddings)
+                topics = model.topics_
+                save_rolling_model(model, sent)
+
+            inicio = 0
+            for mes, idx in nuevos.items():
+                frames[mes].loc[idx, "topic_id"] = topics[inicio:inicio + len(idx)]
+                inicio += len(idx)
+
+        if model is not None:
+            info = model.get_topic_info()
+            etiquetas[sent] = dict(zip(info["Topic"].astype(int), info["Name"].astype(str)))
 
+    # 6.c) Etiquetas vigentes para toda la ventana (mismos IDs, nombres actualizados);
+    #      solo se suben los meses cuyas asignaciones o etiquetas cambiaron
+    keys = []
+    for mes, df in frames.items():
+        df["topic_id"] = df["topic_id"].fillna(-1).astype(int)
+        df["topic_label"] = "outlier"
+        for sent, mapa in etiquetas.items():
+            m = (df["sentiment_pred"] == sent) & (df["topic_id"] != -1)
+            df.loc[m, "topic_label"] = df.loc[m, "topic_id"].map(mapa).fillna("outlier")
+        cortas = df["token_count"] < 3
+        df.loc[cortas, "topic_id"] = -1
+        df.loc[cortas, "topic_label"] = "Comentario Corto"
+        df["topic_mode"] = "rolling"
+        df["topic_backend"] = TOPIC_BACKEND
+        if not assignments_changed(previos[mes], df):
+            print(f"   • {mes}: asignaciones sin cambios, no se vuelve a subir")
+            keys += month_keys(mes)
+            continue
+        keys += upload_month(mes, df.drop(columns=["content_topic"]))
+    return keys
 
 if __name__ == "__main__":
     apply_topics()
@@ -0,0 +1,90 @@
+# viewcache.py
+
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def sizeof(obj) -> int:
+    """
+    Tamaño aproximado en bytes de una vista o agregado (DataFrame, Series, arreglos y tuplas).
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(sizeof(o) for o in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
+
+
+class ViewCache:
+    """
+    LRU de vistas filtradas del dashboard, acotado por número de llaves y por bytes.
+    Cada llave (tupla de filtros normalizada) guarda su vista y los agregados
+    derivados de ella; al desalojar una llave se van también sus agregados.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self._entries    = OrderedDict()   # key -> {"values": {nombre: valor}, "bytes": int}
+        self._bytes      = 0
+        self._lock       = threading.RLock()
+        self.hits        = 0
+        self.misses      = 0
+
+    def get(self, key, name: str, compute):
+        """
+        Devuelve el valor `name` de la llave `key`, calculándolo con `compute()` si falta.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and name in entry["values"]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["values"][name]
+            self.misses += 1
+
+        value = compute()
+        size  = sizeof(value)
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {"values": {}, "bytes": 0})
+            if name in entry["values"]:        # otro hilo lo calculó mientras tanto
+                return entry["values"][name]
+            entry["values"][name] = value
+            entry["bytes"] += size
+            self._bytes    += size
+            self._entries.move_to_end(key)
+            self._evict(protect=key)
+        return value
+
+    def view(self, key, compute):
+        return self.get(key, "view", compute)
+
+    def _evict(self, protect) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == protect:
+                break                          # nunca se desaloja la llave en uso
+            self._bytes -= self._entries.pop(oldest)["bytes"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)